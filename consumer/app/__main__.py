@@ -1,9 +1,15 @@
 import logging
 import sys
+import threading
+import time
+from typing import Optional
 
-from app import cli
-from app.sound import presets
-from app.sound.player import LoopPlayer
+from app.startup import StartupProfile
+
+profile = StartupProfile()
+
+with profile.step("import cli"):
+    from app import cli
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,34 +21,136 @@ if __name__ != "__main__":
     raise RuntimeError("This module should be run as a script")
 
 
-args = cli.parse_args()
-input_plugin = cli.get_plugin(args)
+with profile.step("parse arguments"):
+    args = cli.parse_args()
+metrics = cli.get_metrics(args)
+with profile.step("input plugin"):
+    input_plugin = cli.get_plugin(args, metrics)
 
 if input_plugin is None:
-    logging.error("No input plugin selected. Use --stdin or --uds.")
+    logging.error("No input plugin selected. Use --stdin, --uds or --amqp.")
     sys.exit(1)
 
 
-player = LoopPlayer()
-player.start()
+# Sound modules are imported once the input is set up, numpy and pygame
+# dominate the startup time. scipy is imported when a beat is first
+# synthesized, which a waveform bank avoids altogether.
+with profile.step("import numpy"):
+    import numpy  # noqa: F401  # pyright: ignore[reportUnusedImport]
+with profile.step("import pygame"):
+    import pygame.mixer  # noqa: F401  # pyright: ignore[reportUnusedImport]
+with profile.step("import sound modules"):
+    from app.sound.adapter import ChannelParam
+    from app.sound.beat import Beat, LiveBeat, PCMBeat
+    from app.sound.player import LoopPlayer
+    from app.sound.scheduler import RenderScheduler
+
+with profile.step("mixer init"):
+    ChannelParam()
+
+recorder = cli.get_recorder(args)
+with profile.step("player start"):
+    player = LoopPlayer(recorder=recorder, metrics=metrics)
+    player.start()
+
+preset = cli.get_preset(args)
+cache = cli.get_cache(args)
+bank = cli.get_bank(args)
+with profile.step("bank load"):
+    bank_loaded = bank is not None and bank.load()
+if bank is not None and not bank_loaded:
+    # Beats are rendered through the cache until the bank is built
+    threading.Thread(
+        name="bank-build",
+        target=bank.load_or_build,
+        daemon=True,
+    ).start()
+
+
+def render(bpm: float) -> Beat:
+    if args.synthesis == "live":
+        return LiveBeat.heartbeat(bpm)
+    if bank is not None:
+        pcm = bank.pcm(round(bpm))
+        if pcm is not None:
+            return PCMBeat(pcm)
+    return PCMBeat(cache.get(preset, bpm))
+
+
+first_beat = threading.Event()
+
+
+def on_ready(beat: Beat, timestamp: Optional[float]) -> None:
+    player.set_beat(beat, timestamp)
+    if args.startup_profile and not first_beat.is_set():
+        first_beat.set()
+        profile.mark("first beat")
+        logging.info(profile.report())
+
+
+scheduler = RenderScheduler(
+    render=render,
+    on_ready=on_ready,
+    max_workers=args.render_workers,
+    metrics=metrics,
+)
+
+bpm_store = cli.get_bpm_store(args)
+bpm_store.start()
+
+metrics_exporter = cli.get_metrics_exporter(args, metrics)
+if metrics_exporter is not None:
+    metrics_exporter.start()
+
+session_log = cli.get_session_log(args)
+if session_log is not None:
+    session_log.start()
 
 bpm = cli.get_bpm(args)
 if bpm is not None:
     if args.verbose:
         logging.info(f"Initial BPM: {bpm}")
-    player.set_sound(presets.RealisticHeartbeatSound(bpm=bpm))
+    scheduler.submit(bpm)
+
+if args.cache_warmup and args.synthesis != "live":
+    threading.Thread(
+        name="cache-warmup",
+        target=cache.warm_up,
+        args=(
+            preset,
+            range(args.cache_warmup_min, args.cache_warmup_max + 1),
+        ),
+        daemon=True,
+    ).start()
 
 try:
     input_plugin.start()
-    for bpm in input_plugin.values():
-        bpm = round(bpm)
+    for reading in input_plugin.readings():
+        if metrics is not None:
+            metrics.observe("input", time.monotonic() - reading.timestamp)
+        if session_log is not None:
+            session_log.log(reading)
+        bpm = round(reading.value)
         if args.verbose:
             logging.info(f"Received BPM: {bpm}")
-        player.set_sound(presets.RealisticHeartbeatSound(bpm=bpm))
-        cli.set_bpm(args, round(bpm))
+        scheduler.submit(bpm, reading.timestamp)
+        bpm_store.set(bpm)
 except Exception:
     logging.exception("Stopping the application")
 finally:
+    if args.verbose:
+        logging.info(f"Waveform cache: {cache.hits} hits, {cache.misses} misses")
+        logging.info(
+            f"Renders: {scheduler.rendered} delivered, {scheduler.dropped} dropped"
+        )
+    scheduler.stop()
+    bpm_store.stop()
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+    if session_log is not None:
+        session_log.stop()
     player.stop()
+    if recorder is not None:
+        recorder.close()
     input_plugin.stop()
     logging.info("Application stopped")
@@ -0,0 +1,154 @@
+import logging
+import threading
+from bisect import bisect_left
+from typing import Sequence
+
+from app.persistence import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # The last count holds the values above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Latency histograms of the stages between receiving a BPM and hearing it
+
+    Stages are timed with the monotonic clock:
+        receive: an input is ready to be read until its data has been read
+        parse: the data has been read until its values are decoded
+        input: an input is ready until the consumer takes its value
+        render: a BPM is requested until its sound has been rendered
+        crossfade: a sound is ready until the player crossfades into it
+        play: the crossfade starts until its first block is playing
+        end_to_end: an input is ready until its sound is playing
+
+    Components take an optional Metrics instance and skip all timing when
+    they are given None, so instrumentation costs nothing when it is off.
+    """
+
+    STAGES = (
+        "receive",
+        "parse",
+        "input",
+        "render",
+        "crossfade",
+        "play",
+        "end_to_end",
+    )
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.__lock = threading.Lock()
+        self.__histograms = {stage: Histogram(buckets) for stage in self.STAGES}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Record the duration of a stage
+        """
+        with self.__lock:
+            self.__histograms[stage].observe(seconds)
+
+    def to_prometheus(self) -> str:
+        """
+        Histograms in the Prometheus text exposition format
+        """
+        name = "artbit_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Latency of the stages from a received BPM to playback",
+            f"# TYPE {name} histogram",
+        ]
+        with self.__lock:
+            for stage, histogram in self.__histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}'
+                )
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    Writes the metrics to a file from a background thread
+
+    The file is replaced atomically, so it can be scraped at any time,
+    for example by the node exporter textfile collector.
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = 5.0) -> None:
+        """Create a metrics exporter.
+
+        Args:
+            metrics: Metrics to export
+            path: Path to the file the metrics are written to
+            interval: Time between two writes in seconds
+        """
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(
+            name="metrics-exporter", target=self.__run, daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread and write the final metrics
+        """
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.write()
+
+    def write(self) -> None:
+        try:
+            write_atomic(self.path, self.metrics.to_prometheus())
+        except OSError:
+            logger.exception(f"Failed to write metrics to {self.path}")
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.interval):
+            self.write()
@@ -0,0 +1,358 @@
+"""
+Render a heartbeat track from a recorded BPM series without playing it
+
+The series is read from a file or standard input, one "timestamp bpm" pair
+per line with the timestamp in seconds. Beats are scheduled back to back like
+in live playback: every beat uses the BPM in effect at its start, a change of
+BPM moves the next beat to one new period after the start of the current one,
+and is crossfaded at the beat boundary. The track is written as WAV or raw
+signed 16-bit PCM without opening an audio device. Run from the consumer
+directory:
+
+    python -m app.offline session.txt --output track.wav
+"""
+
+import argparse
+import logging
+import os
+import sys
+import wave
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional
+
+# pygame prints a banner to stdout on import, which would corrupt a track
+# written to stdout. It is imported by the presets through the sound adapter.
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np  # noqa: E402
+from numpy.typing import NDArray  # noqa: E402
+
+from app.sound.crossfade import crossfade_curves, crossfade_length  # noqa: E402
+from app.sound.presets import RealisticHeartbeatSound  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Largest sample value of the signed 16-bit output
+MAX_AMPLITUDE = (1 << 15) - 1
+
+
+class ScheduledBeat(NamedTuple):
+    """
+    A beat of the rendered track
+    """
+
+    # Position of the first frame of the beat in the track
+    position: int
+    bpm: int
+    # Length of the beat in the track, trimmed or extended by BPM changes
+    frames: int
+    # BPM and length of the beat before, crossfaded into this one if it differs
+    previous_bpm: Optional[int]
+    previous_frames: Optional[int]
+
+
+class Segment(NamedTuple):
+    """
+    Consecutive beats rendered together by a worker
+    """
+
+    beats: list[ScheduledBeat]
+    framerate: int
+    channels: int
+    seed: Optional[int]
+
+
+def read_series(lines: Iterable[str]) -> list[tuple[float, float]]:
+    """
+    Parse "timestamp bpm" lines, sorted by time and relative to the first one
+
+    Values may be separated by whitespace or a comma. Empty lines and lines
+    starting with # are skipped, as are invalid lines.
+    """
+    series: list[tuple[float, float]] = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            timestamp, bpm = (float(field) for field in line.replace(",", " ").split())
+        except ValueError:
+            logger.warning(f"Invalid line: {line[:32]!r}")
+            continue
+        if bpm <= 0:
+            logger.warning(f"Invalid BPM: {line[:32]!r}")
+            continue
+        series.append((timestamp, bpm))
+
+    series.sort()
+    if series:
+        start = series[0][0]
+        series = [(timestamp - start, bpm) for timestamp, bpm in series]
+    return series
+
+
+def beat_frames(bpm: int, framerate: int) -> int:
+    """
+    Length of a beat in frames, as rendered by RealisticHeartbeatSound
+    """
+    return round(60.0 / bpm * framerate)
+
+
+def schedule(
+    series: list[tuple[float, float]],
+    framerate: int,
+    duration: Optional[float] = None,
+) -> Iterator[ScheduledBeat]:
+    """Schedule beats back to back following the BPM series.
+
+    Args:
+        series: Relative timestamps in seconds and BPM values, sorted by time
+        framerate: Framerate of the track
+        duration: Length of the track in seconds, by default the track ends
+            one beat after the last value
+    """
+    times = [timestamp for timestamp, _ in series]
+    if duration is None:
+        duration = times[-1] + 60.0 / series[-1][1]
+    end = round(duration * framerate)
+
+    position = 0
+    previous: Optional[ScheduledBeat] = None
+    while position < end:
+        index = bisect_right(times, position / framerate)
+        bpm = round(series[max(0, index - 1)][1])
+        beat_end = position + beat_frames(bpm, framerate)
+
+        # Values arriving during the beat move its end like in LoopPlayer,
+        # an overdue beat ends when the value arrives
+        while index < len(series) and round(times[index] * framerate) < beat_end:
+            arrival = round(times[index] * framerate)
+            period = beat_frames(round(series[index][1]), framerate)
+            beat_end = max(position + period, arrival)
+            index += 1
+
+        beat = ScheduledBeat(
+            position,
+            bpm,
+            beat_end - position,
+            None if previous is None else previous.bpm,
+            None if previous is None else previous.frames,
+        )
+        yield beat
+        position = beat_end
+        previous = beat
+
+
+def segments(
+    beats: Iterable[ScheduledBeat],
+    size: int,
+    framerate: int,
+    channels: int,
+    seed: Optional[int],
+) -> Iterator[Segment]:
+    """
+    Split the scheduled beats into segments of the given number of beats
+    """
+    batch: list[ScheduledBeat] = []
+    for beat in beats:
+        batch.append(beat)
+        if len(batch) == size:
+            yield Segment(batch, framerate, channels, seed)
+            batch = []
+    if batch:
+        yield Segment(batch, framerate, channels, seed)
+
+
+@lru_cache(maxsize=64)
+def beat_wave(bpm: int, framerate: int, seed: Optional[int]) -> NDArray[np.float32]:
+    """Soundwave of a single beat scaled to the output sample range.
+
+    Args:
+        bpm: Beats per minute
+        framerate: Framerate of the soundwave
+        seed: Seed of the noise, beats of the same BPM sound the same
+            in every segment when given
+    """
+    if seed is not None:
+        np.random.seed((seed + bpm) % 2**32)
+    synthesized = RealisticHeartbeatSound.synthesize(bpm, framerate)
+    result = RealisticHeartbeatSound.normalize_range(
+        synthesized, -MAX_AMPLITUDE, MAX_AMPLITUDE
+    )
+    result.setflags(write=False)
+    return result
+
+
+def render_segment(segment: Segment) -> bytes:
+    """
+    Render a segment into interleaved signed 16-bit frames
+    """
+    first, last = segment.beats[0], segment.beats[-1]
+    mix = np.empty(last.position + last.frames - first.position, dtype=np.float32)
+
+    for beat in segment.beats:
+        incoming = beat_wave(beat.bpm, segment.framerate, segment.seed)
+        start = beat.position - first.position
+        out = mix[start : start + beat.frames]
+        # An extended beat holds its last frame
+        audible = min(beat.frames, len(incoming))
+        out[:audible] = incoming[:audible]
+        out[audible:] = incoming[-1]
+
+        if (
+            beat.previous_bpm is None
+            or beat.previous_frames is None
+            or beat.previous_bpm == beat.bpm
+        ):
+            continue
+
+        # Mix in the continuation of the outgoing loop, a trimmed beat
+        # continues from where it was cut and an extended one from its start
+        outgoing = beat_wave(beat.previous_bpm, segment.framerate, segment.seed)
+        offset = beat.previous_frames if beat.previous_frames < len(outgoing) else 0
+        length = crossfade_length(len(outgoing), len(incoming))
+        fade_in, fade_out = crossfade_curves(length)
+        out[:length] *= fade_in[:, 0]
+        tail = outgoing.take(np.arange(offset, offset + length), mode="wrap")
+        out[:length] += tail * fade_out[:, 0]
+
+    np.rint(mix, out=mix)
+    np.clip(mix, -MAX_AMPLITUDE - 1, MAX_AMPLITUDE, out=mix)
+    # Cast once into the first channel, the others are integer copies of it
+    frames = np.empty((len(mix), segment.channels), dtype="<i2")
+    frames[:, 0] = mix
+    for i in range(1, segment.channels):
+        frames[:, i] = frames[:, 0]
+    return frames.tobytes()
+
+
+def render(segments: Iterable[Segment], workers: int) -> Iterator[bytes]:
+    """
+    Render segments in order, in parallel worker processes if more than one
+    """
+    if workers <= 1:
+        yield from map(render_segment, segments)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of segments in flight to bound the memory use
+        pending: deque[Future[bytes]] = deque()
+        for segment in segments:
+            pending.append(executor.submit(render_segment, segment))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_wav(
+    path: str, chunks: Iterable[bytes], framerate: int, channels: int
+) -> None:
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(framerate)
+        for chunk in chunks:
+            f.writeframesraw(chunk)
+
+
+def write_raw(output: BinaryIO, chunks: Iterable[bytes]) -> None:
+    for chunk in chunks:
+        output.write(chunk)
+    output.flush()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(name)s\t%(message)s")
+
+    args_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    args_parser.add_argument(
+        "input",
+        help="File with the BPM series, standard input if omitted or -",
+        nargs="?",
+        default="-",
+    )
+    args_parser.add_argument(
+        "--output",
+        help="File to write the track to, raw PCM to standard output if omitted or -",
+        default="-",
+    )
+    args_parser.add_argument(
+        "--format",
+        help="Output format, WAV for .wav files and raw PCM otherwise by default",
+        choices=["wav", "raw"],
+    )
+    args_parser.add_argument(
+        "--framerate",
+        help="Framerate of the track",
+        type=int,
+        default=44100,
+    )
+    args_parser.add_argument(
+        "--channels",
+        help="Number of channels of the track",
+        type=int,
+        default=2,
+    )
+    args_parser.add_argument(
+        "--duration",
+        help="Length of the track in seconds, one beat after the last value by default",
+        type=float,
+    )
+    args_parser.add_argument(
+        "--seed",
+        help="Seed of the noise for reproducible tracks",
+        type=int,
+    )
+    args_parser.add_argument(
+        "--segment-beats",
+        help="Number of beats rendered together by a worker",
+        type=int,
+        default=64,
+    )
+    args_parser.add_argument(
+        "--workers",
+        help="Number of worker processes rendering segments",
+        type=int,
+        default=os.cpu_count() or 1,
+    )
+    args = args_parser.parse_args()
+
+    if args.input == "-":
+        series = read_series(sys.stdin)
+    else:
+        with open(args.input) as f:
+            series = read_series(f)
+    if not series:
+        logger.error("No BPM values to render")
+        sys.exit(1)
+
+    output_format = args.format
+    if output_format is None:
+        output_format = "wav" if args.output.lower().endswith(".wav") else "raw"
+    if output_format == "wav" and args.output == "-":
+        logger.error("WAV output needs a file, use --format raw for standard output")
+        sys.exit(1)
+
+    beats = schedule(series, args.framerate, args.duration)
+    chunks = render(
+        segments(beats, args.segment_beats, args.framerate, args.channels, args.seed),
+        args.workers,
+    )
+
+    if output_format == "wav":
+        write_wav(args.output, chunks, args.framerate, args.channels)
+    elif args.output == "-":
+        write_raw(sys.stdout.buffer, chunks)
+    else:
+        with open(args.output, "wb") as f:
+            write_raw(f, chunks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path: str, data: str) -> None:
+    """
+    Replace the contents of a file atomically
+
+    Data is written to a temporary file in the same directory, synced to disk,
+    and renamed over the target, so readers never see a partially written file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class BPMStore:
+    """
+    Persists the latest BPM value from a background thread
+
+    Updates only record the value in memory. The thread writes it to disk
+    at most once per interval, and once more when the store is stopped.
+    """
+
+    def __init__(self, path: str, interval: float = 5.0) -> None:
+        """Create a BPM store.
+
+        Args:
+            path: Path to the file where the last BPM is stored
+            interval: Minimum time between two writes in seconds
+        """
+        self.path = path
+        self.interval = interval
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = None
+        self.__value: int | None = None
+        self.__written: int | None = None
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(
+            name="bpm-store", target=self.__run, daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread and write the latest value
+        """
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.flush()
+
+    def set(self, bpm: int) -> None:
+        """
+        Record the latest BPM value without touching the disk
+        """
+        with self.__lock:
+            self.__value = bpm
+
+    def flush(self) -> None:
+        """
+        Write the latest value if it has changed since the last write
+        """
+        with self.__lock:
+            value = self.__value
+        if value is None or value == self.__written:
+            return
+
+        try:
+            write_atomic(self.path, str(value))
+        except OSError:
+            logger.exception(f"Failed to write BPM to {self.path}")
+            return
+        self.__written = value
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.interval):
+            self.flush()
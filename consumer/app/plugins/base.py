@@ -1,5 +1,23 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Generator
+from typing import Generator, NamedTuple, Optional
+
+
+class Reading(NamedTuple):
+    """
+    A value received by a plugin
+    """
+
+    # Received value
+    value: float
+    # Identifier of the producer that sent the value
+    source: str
+    # Monotonic clock time at which the value was received
+    timestamp: float
+    # Monotonic clock time of the producer in nanoseconds at which the value
+    # was sent, if the format carries it. The clocks of the producer and the
+    # consumer are not comparable, only differences of sent times are.
+    sent: Optional[int] = None
 
 
 class Plugin(ABC):
@@ -14,6 +32,14 @@ class Plugin(ABC):
         """
         pass
 
+    def readings(self) -> Generator[Reading, None, None]:
+        """
+        Returns a generator that yields values with their source and receive time
+        """
+        source = type(self).__name__
+        for value in self.values():
+            yield Reading(value, source, time.monotonic())
+
     @abstractmethod
     def start(self) -> None:
         """
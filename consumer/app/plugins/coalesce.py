@@ -0,0 +1,114 @@
+import threading
+import time
+from queue import Empty, Queue
+from typing import Generator
+
+from app.plugins.base import Plugin, Reading
+
+
+class CoalescingPlugin(Plugin):
+    """
+    A plugin that thins out the values of another plugin
+
+    Values are smoothed with an exponentially weighted moving average,
+    only the latest value within a time window is kept, and a value is
+    passed on only when it differs enough from the previously passed one.
+    """
+
+    def __init__(
+        self,
+        plugin: Plugin,
+        window: float = 0.0,
+        min_delta: float = 0.0,
+        alpha: float = 1.0,
+    ) -> None:
+        """Create a coalescing plugin.
+
+        Args:
+            plugin: Plugin providing the values
+            window: Time window in seconds in which the latest value wins
+            min_delta: Minimum change to the previously passed value
+            alpha: EWMA smoothing factor, 1.0 disables smoothing
+        """
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("Smoothing factor must be in range (0, 1]")
+
+        self.plugin = plugin
+        self.window = window
+        self.min_delta = min_delta
+        self.alpha = alpha
+        # Readings of the wrapped plugin, None marks the end of its readings
+        self.__queue: Queue[Reading | BaseException | None] = Queue()
+        self.__thread = None
+
+    def start(self) -> None:
+        """
+        Starts the wrapped plugin and a thread reading its values.
+        """
+        self.plugin.start()
+        self.__thread = threading.Thread(
+            name="coalesce-reader", target=self.__read, daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the wrapped plugin.
+        """
+        self.plugin.stop()
+
+    def values(self) -> Generator[float, None, None]:
+        """
+        Yields the smoothed latest value of each window.
+        """
+        for reading in self.readings():
+            yield reading.value
+
+    def readings(self) -> Generator[Reading, None, None]:
+        """
+        Yields the smoothed latest reading of each window.
+        """
+        smoothed = None
+        last = None
+        ended = False
+        while not ended:
+            reading = self.__get()
+            if reading is None:
+                return
+            smoothed = self.__smooth(smoothed, reading.value)
+
+            deadline = time.monotonic() + self.window
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    latest = self.__get(timeout=remaining)
+                except Empty:
+                    break
+                if latest is None:
+                    ended = True
+                    break
+                reading = latest
+                smoothed = self.__smooth(smoothed, reading.value)
+
+            if last is None or abs(smoothed - last) >= self.min_delta:
+                last = smoothed
+                yield reading._replace(value=smoothed)
+
+    def __smooth(self, smoothed: float | None, value: float) -> float:
+        if smoothed is None:
+            return value
+        return self.alpha * value + (1.0 - self.alpha) * smoothed
+
+    def __get(self, timeout: float | None = None) -> Reading | None:
+        item = self.__queue.get(timeout=timeout)
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def __read(self) -> None:
+        try:
+            for reading in self.plugin.readings():
+                self.__queue.put(reading)
+        except BaseException as e:
+            self.__queue.put(e)
+        else:
+            self.__queue.put(None)
@@ -0,0 +1,137 @@
+import logging
+import struct
+from typing import Iterator, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Streams in the binary format start with this magic,
+# anything else is read as newline-separated text values
+BINARY_MAGIC = b"ABT\x01"
+
+# Little-endian float64 BPM, int64 producer monotonic time in nanoseconds
+# and uint64 sequence number
+RECORD = struct.Struct("<dqQ")
+
+
+class Record(NamedTuple):
+    """
+    A decoded value, only the binary format carries its time and sequence number
+    """
+
+    value: float
+    # Monotonic time of the producer in nanoseconds
+    timestamp: Optional[int] = None
+    sequence: Optional[int] = None
+
+
+def encode_record(value: float, timestamp: int, sequence: int) -> bytes:
+    """
+    Encode a value in the binary format
+    """
+    return RECORD.pack(value, timestamp, sequence)
+
+
+def decode_records(data: bytes | memoryview) -> Iterator[Record]:
+    """
+    Decode a buffer holding a whole number of binary records
+    """
+    return map(Record._make, RECORD.iter_unpack(data))
+
+
+def decode_text(data: bytes | bytearray) -> list[float]:
+    """
+    Decode newline-separated text values, skipping invalid lines
+    """
+    values: list[float] = []
+    for line in data.split():
+        try:
+            values.append(float(line))
+        except ValueError:
+            logger.warning(f"Invalid value: {line[:32]!r}")
+    return values
+
+
+class StreamDecoder:
+    """
+    Incremental decoder for a stream in the binary or the text format
+
+    The format is negotiated from the first bytes of the stream. Data is
+    received straight into a fixed buffer through the memoryview returned by
+    free(), and every complete record in it is decoded at once by feed().
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        """Create a stream decoder.
+
+        Args:
+            capacity: Size of the receive buffer in bytes
+        """
+        self.binary: bool | None = None
+        self.lost = 0
+        self.__buffer = bytearray(capacity)
+        self.__view = memoryview(self.__buffer)
+        self.__filled = 0
+        self.__sequence: int | None = None
+
+    def free(self) -> memoryview:
+        """
+        Unused part of the receive buffer to receive data into
+        """
+        return self.__view[self.__filled :]
+
+    def feed(self, count: int) -> list[Record]:
+        """
+        Decode the records completed by count bytes received into free()
+        """
+        self.__filled += count
+
+        if self.binary is None and not self.__negotiate():
+            return []
+
+        if self.binary:
+            values, consumed = self.__decode_binary()
+        else:
+            values, consumed = self.__decode_text()
+
+        self.__discard(consumed)
+        return values
+
+    def __discard(self, count: int) -> None:
+        """Move the data after the first count bytes to the start of the buffer."""
+        if count == 0:
+            return
+        remainder = self.__filled - count
+        self.__buffer[:remainder] = bytes(self.__view[count : self.__filled])
+        self.__filled = remainder
+
+    def __negotiate(self) -> bool:
+        head = bytes(self.__view[: min(self.__filled, len(BINARY_MAGIC))])
+        if BINARY_MAGIC.startswith(head):
+            if len(head) < len(BINARY_MAGIC):
+                return False
+            self.binary = True
+            self.__discard(len(head))
+        else:
+            self.binary = False
+        return True
+
+    def __decode_binary(self) -> tuple[list[Record], int]:
+        consumed = self.__filled - self.__filled % RECORD.size
+        unpacked = list(RECORD.iter_unpack(self.__view[:consumed]))
+        if unpacked:
+            # Count the sequence numbers missing before and within the batch
+            first, last = unpacked[0][2], unpacked[-1][2]
+            if self.__sequence is not None:
+                first = self.__sequence + 1
+            self.lost += max(0, last - first + 1 - len(unpacked))
+            self.__sequence = last
+        return [Record._make(fields) for fields in unpacked], consumed
+
+    def __decode_text(self) -> tuple[list[Record], int]:
+        end = self.__buffer.rfind(b"\n", 0, self.__filled)
+        if end < 0:
+            if self.__filled == len(self.__buffer):
+                logger.warning("Discarding text line longer than the buffer")
+                return [], self.__filled
+            return [], 0
+        return [Record(value) for value in decode_text(self.__buffer[:end])], end + 1
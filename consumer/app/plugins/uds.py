@@ -1,21 +1,64 @@
 import logging
 import os
+import selectors
 import socket
-from typing import Generator
+import threading
+import time
+from typing import Generator, Optional
 
-from app.plugins.base import Plugin
+from app.metrics import Metrics
+from app.plugins.base import Plugin, Reading
+from app.plugins.protocol import StreamDecoder
+
+
+class UDSConnection:
+    """
+    A producer connected to the UDS socket
+    """
+
+    def __init__(self, connection: socket.socket, source: str) -> None:
+        self.connection = connection
+        self.source = source
+        self.decoder = StreamDecoder()
+
+    def close(self) -> None:
+        self.connection.close()
 
 
 class UDSPlugin(Plugin):
     """
     A plugin that reads from a UDS socket
+
+    Any number of producers can be connected at the same time. The socket
+    is served without blocking, so a stalled producer never holds up the others.
+    Each connection sends either framed binary records or newline-separated
+    text values, see app.plugins.protocol.
     """
 
-    def __init__(self, path: str, timeout: float = 0.1) -> None:
+    def __init__(
+        self,
+        path: str,
+        timeout: float = 0.1,
+        backlog: int = 16,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        """Create a UDS plugin.
+
+        Args:
+            path: Path to the UDS socket
+            timeout: Time in seconds to wait for socket events per poll
+            backlog: Number of pending connections the socket queues up
+            metrics: Metrics receiving the receive and parse latencies
+        """
         self.path = path
         self.timeout = timeout
-        self.server = None
-        self.connection = None
+        self.backlog = backlog
+        self.metrics = metrics
+        self.server: Optional[socket.socket] = None
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.connections: dict[int, UDSConnection] = {}
+        self.__connection_count = 0
+        self.__stopped = threading.Event()
 
     def start(self) -> None:
         """
@@ -31,13 +74,22 @@ class UDSPlugin(Plugin):
 
         self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         self.server.bind(self.path)
-        self.server.listen(1)
+        self.server.listen(self.backlog)
+        self.server.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.__stopped.clear()
 
     def stop(self) -> None:
+        self.__stopped.set()
         try:
-            if self.connection:
-                self.connection.close()
-                self.connection = None
+            for connection in self.connections.values():
+                connection.close()
+            self.connections.clear()
+            if self.selector:
+                self.selector.close()
+                self.selector = None
             if self.server:
                 self.server.close()
                 self.server = None
@@ -48,29 +100,80 @@ class UDSPlugin(Plugin):
         """
         Reads from the UDS socket and yields the values.
         """
-        if self.server is None:
+        for reading in self.readings():
+            yield reading.value
+
+    def readings(self) -> Generator[Reading, None, None]:
+        """
+        Reads from all connected producers and yields their readings.
+        """
+        if self.server is None or self.selector is None:
             raise RuntimeError(
                 "Plugin not started. Call start() before using values()."
             )
 
-        self.connection, _ = self.server.accept()
-        logging.info(f"Client connected to {self.path}")
-
-        while True:
-            try:
-                data = self.connection.recv(1024)
-                if not data:
-                    logging.info("Client disconnected, closing connection")
-                    self.connection.close()
-                    logging.info("Waiting for new client")
-                    self.connection, _ = self.server.accept()
-                    logging.info(f"Client connected to {self.path}")
-                    continue
-                for line in data.decode("utf-8").splitlines():
-                    if line:
-                        yield float(line)
-            except (BlockingIOError, TimeoutError):
-                pass
-            except Exception:
-                logging.exception("Error reading from UDS socket")
-                raise
+        while not self.__stopped.is_set():
+            events = self.selector.select(timeout=self.timeout)
+            # Readings are stamped when their connection is ready, connections
+            # served after others in the same batch wait for them
+            ready = time.monotonic()
+            for key, _ in events:
+                if key.fileobj is self.server:
+                    self.__accept()
+                else:
+                    yield from self.__receive(self.connections[key.fd], ready)
+
+    def __accept(self) -> None:
+        assert self.server is not None and self.selector is not None
+        try:
+            connection, _ = self.server.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+
+        self.__connection_count += 1
+        source = f"uds:{self.__connection_count}"
+        connection.setblocking(False)
+        self.connections[connection.fileno()] = UDSConnection(connection, source)
+        self.selector.register(connection, selectors.EVENT_READ)
+        logging.info(f"Client {source} connected to {self.path}")
+
+    def __disconnect(self, connection: UDSConnection) -> None:
+        assert self.selector is not None
+        self.selector.unregister(connection.connection)
+        del self.connections[connection.connection.fileno()]
+        connection.close()
+        protocol = "binary" if connection.decoder.binary else "text"
+        logging.info(f"Client {connection.source} ({protocol}) disconnected")
+
+    def __receive(
+        self, connection: UDSConnection, ready: float
+    ) -> Generator[Reading, None, None]:
+        try:
+            count = connection.connection.recv_into(connection.decoder.free())
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            logging.exception(f"Error reading from client {connection.source}")
+            self.__disconnect(connection)
+            return
+
+        if count == 0:
+            self.__disconnect(connection)
+            return
+
+        received = time.monotonic()
+        lost = connection.decoder.lost
+        records = connection.decoder.feed(count)
+        if self.metrics is not None and records:
+            self.metrics.observe("receive", received - ready)
+            self.metrics.observe("parse", time.monotonic() - received)
+        if connection.decoder.lost > lost:
+            logging.warning(
+                f"Client {connection.source} skipped "
+                f"{connection.decoder.lost - lost} sequence numbers"
+            )
+
+        for record in records:
+            # Readings are attributed to the plugin, connection numbers grow
+            # with every reconnect of a producer
+            yield Reading(record.value, "uds", ready, record.timestamp)
@@ -0,0 +1,301 @@
+import logging
+from collections import OrderedDict, deque
+from typing import Generator, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.typing import NDArray
+
+from app.plugins.base import Plugin, Reading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodDetector:
+    """
+    Detects heartbeat periods in a sensor waveform, block by block
+
+    Follows waveform.PeriodDetector of the producer kernel: values are
+    smoothed with a rolling average, scaled by the range of a rolling
+    min-max window, and the peak of every excursion above the threshold is
+    a beat. Values, amplitudes and periods out of their limits reset the
+    detector, the min-max window is kept like in the producer. Periods are
+    measured in samples rather than with the wall clock, and a BPM is
+    emitted from the second period on.
+
+    Each block is processed with vectorized operations up to the next
+    reset, the state carried between blocks is bounded by the window sizes.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 500.0,
+        threshold: float = 0.8,
+        period_limit: tuple[float, float] = (0.333, 1.5),
+        value_limit: tuple[float, float] = (0.1, 0.98),
+        amplitude_limit: tuple[float, float] = (0.1, 0.9),
+        value_window: int = 20,
+        period_window: int = 10,
+        minmax_window: int = 1000,
+    ) -> None:
+        """Create a period detector with the limits of the producer kernel.
+
+        Args:
+            sample_rate: Samples per second of the waveform
+            threshold: Scaled value above which the waveform is in a beat
+            period_limit: Shortest and longest period in seconds
+            value_limit: Lowest and highest valid sample value
+            amplitude_limit: Smallest and largest valid range of the
+                smoothed values in the min-max window
+            value_window: Number of samples in the rolling average
+            period_window: Number of periods in the rolling average
+            minmax_window: Number of smoothed values in the min-max window
+        """
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.period_limit = period_limit
+        self.value_limit = value_limit
+        self.amplitude_limit = amplitude_limit
+        self.value_window = value_window
+        self.minmax_window = minmax_window
+
+        # Index of the next sample in the waveform
+        self.__position = 0
+        # Latest samples since the last reset, completing the next average
+        self.__tail: NDArray[np.float64] = np.empty(0)
+        # Latest smoothed values of the min-max window, not cleared on reset
+        self.__window: NDArray[np.float64] = np.empty(0)
+        self.__periods: deque[float] = deque(maxlen=period_window)
+        self.__period_count = 0
+        self.__in_high = False
+        self.__peak_value = 0.0
+        self.__peak: Optional[int] = None
+        self.__previous_peak: Optional[int] = None
+
+    def update(self, samples: NDArray[np.float64]) -> list[float]:
+        """
+        Process a block of samples, returns the BPM of every period it completes
+        """
+        bpms: list[float] = []
+        start = 0
+        while start < len(samples):
+            start += self.__update_segment(samples[start:], bpms)
+        return bpms
+
+    def reset(self) -> None:
+        self.__tail = np.empty(0)
+        self.__periods.clear()
+        self.__period_count = 0
+        self.__in_high = False
+        self.__peak_value = 0.0
+        self.__peak = None
+        self.__previous_peak = None
+
+    def __update_segment(self, samples: NDArray[np.float64], bpms: list[float]) -> int:
+        """Process samples up to the first reset, returns the number processed."""
+        low, high = self.value_limit
+        valid = (samples >= low) & (samples <= high)
+        if not valid[0]:
+            # Every invalid value resets the detector, skip to the next valid one
+            skipped = int(np.argmax(valid)) if valid.any() else len(samples)
+            logger.debug(f"{skipped} values out of range {self.value_limit}")
+            self.reset()
+            self.__position += skipped
+            return skipped
+        end = len(samples) if valid.all() else int(np.argmin(valid))
+
+        # Rolling average of the samples since the last reset, the first
+        # average is of the sample at offset first of the segment
+        values = np.concatenate((self.__tail, samples[:end]))
+        sums = np.concatenate(([0.0], np.cumsum(values)))
+        window = self.value_window
+        averages = (sums[window:] - sums[:-window]) / window
+        first = len(values) - len(self.__tail) - len(averages)
+        self.__tail = values[len(values) - min(len(values), window - 1) :]
+
+        # Range of the min-max window at every average, from the first average
+        # that completes the window
+        history = np.concatenate((self.__window, averages))
+        ready = max(0, self.minmax_window - 1 - len(self.__window))
+        stop = len(averages)
+        reset_at: Optional[int] = None
+        if len(history) >= self.minmax_window:
+            windows = sliding_window_view(history, self.minmax_window)
+            minimum = windows.min(axis=1)
+            maximum = windows.max(axis=1)
+            ranges = maximum - minimum
+
+            low, high = self.amplitude_limit
+            invalid = np.flatnonzero((ranges < low) | (ranges > high))
+            if len(invalid):
+                stop = reset_at = ready + int(invalid[0])
+
+            # Amplitudes are valid, so the range is never zero
+            count = stop - ready
+            scaled = (averages[ready:stop] - minimum[:count]) / ranges[:count]
+            positions = self.__position + first + np.arange(ready, stop)
+            detected = self.__detect(scaled, positions, bpms)
+            if detected is not None:
+                stop = reset_at = ready + detected
+
+        # The value that resets the detector is still part of the window
+        if reset_at is not None:
+            history = history[: len(self.__window) + reset_at + 1]
+        self.__window = history[
+            len(history) - min(len(history), self.minmax_window - 1) :
+        ]
+
+        if reset_at is None:
+            consumed = end
+        else:
+            consumed = first + reset_at + 1
+            self.reset()
+        self.__position += consumed
+        return consumed
+
+    def __detect(
+        self,
+        scaled: NDArray[np.float64],
+        positions: NDArray[np.int64],
+        bpms: list[float],
+    ) -> Optional[int]:
+        """
+        Find the beats in scaled values, returns the index of the value that
+        resets the detector if any
+        """
+        above = scaled > self.threshold
+        below = scaled < self.threshold
+        i = 0
+        while i < len(scaled):
+            if not self.__in_high:
+                starts = np.flatnonzero(above[i:])
+                if not len(starts):
+                    return None
+                i += int(starts[0])
+                self.__in_high = True
+
+            # The beat lasts until the first value below the threshold,
+            # its peak is the first highest value
+            ends = np.flatnonzero(below[i:])
+            end = i + int(ends[0]) if len(ends) else len(scaled)
+            if end > i:
+                peak = i + int(np.argmax(scaled[i:end]))
+                if above[peak] and scaled[peak] > self.__peak_value:
+                    self.__peak_value = float(scaled[peak])
+                    self.__peak = int(positions[peak])
+            if end == len(scaled):
+                return None
+
+            self.__in_high = False
+            if not self.__complete_period(bpms):
+                return end
+            i = end + 1
+        return None
+
+    def __complete_period(self, bpms: list[float]) -> bool:
+        """Record the period ending at the current peak, False if it is invalid."""
+        peak = self.__peak
+        if self.__previous_peak is not None and peak is not None:
+            period = (peak - self.__previous_peak) / self.sample_rate
+            low, high = self.period_limit
+            if not low <= period <= high:
+                logger.debug(
+                    f"Period of {period:.3f} s out of range {self.period_limit}"
+                )
+                return False
+
+            self.__periods.append(period)
+            self.__period_count += 1
+            # The first period may start from a partial beat
+            if self.__period_count > 1:
+                average = sum(self.__periods) / len(self.__periods)
+                # Truncated to whole milliseconds like in the producer
+                bpms.append(60.0 / (int(average * 1000) / 1000))
+
+        self.__previous_peak = peak
+        self.__peak = None
+        self.__peak_value = 0.0
+        return True
+
+
+class WaveformSource:
+    """
+    Period detector and the block of samples being collected for a source
+    """
+
+    def __init__(self, detector: PeriodDetector, block_size: int) -> None:
+        self.detector = detector
+        self.block: NDArray[np.float64] = np.empty(block_size)
+        self.filled = 0
+
+
+class WaveformPlugin(Plugin):
+    """
+    A plugin that detects the heart rate from raw sensor samples
+
+    The values of the wrapped plugin are samples of the sensor waveform at a
+    fixed rate, such as the 2 ms sampling of the producer kernel. Samples of
+    each source are collected into blocks, and every period detected in a
+    block yields its BPM with the receive time of the sample completing it.
+    """
+
+    def __init__(
+        self,
+        plugin: Plugin,
+        sample_rate: float = 500.0,
+        block_size: int = 50,
+        max_sources: int = 16,
+    ) -> None:
+        """Create a waveform plugin.
+
+        Args:
+            plugin: Plugin providing the samples
+            sample_rate: Samples per second sent by every source
+            block_size: Number of samples processed at once, at most
+                block_size / sample_rate seconds of detection latency
+            max_sources: Number of sources tracked at once, the least
+                recently seen source is dropped beyond it
+        """
+        self.plugin = plugin
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.max_sources = max_sources
+        self.__sources: OrderedDict[str, WaveformSource] = OrderedDict()
+
+    def start(self) -> None:
+        self.plugin.start()
+
+    def stop(self) -> None:
+        self.plugin.stop()
+
+    def values(self) -> Generator[float, None, None]:
+        for reading in self.readings():
+            yield reading.value
+
+    def readings(self) -> Generator[Reading, None, None]:
+        """
+        Yields the BPM of every period detected in the samples of a source.
+        """
+        for reading in self.plugin.readings():
+            source = self.__source(reading.source)
+            source.block[source.filled] = reading.value
+            source.filled += 1
+            if source.filled < self.block_size:
+                continue
+
+            source.filled = 0
+            for bpm in source.detector.update(source.block):
+                yield Reading(bpm, reading.source, reading.timestamp, reading.sent)
+
+    def __source(self, name: str) -> WaveformSource:
+        source = self.__sources.get(name)
+        if source is None:
+            source = WaveformSource(
+                PeriodDetector(sample_rate=self.sample_rate), self.block_size
+            )
+            self.__sources[name] = source
+            if len(self.__sources) > self.max_sources:
+                self.__sources.popitem(last=False)
+        else:
+            self.__sources.move_to_end(name)
+        return source
@@ -0,0 +1,33 @@
+import glob
+import os
+import re
+
+
+def rotated_path(path: str, index: int) -> str:
+    """
+    Path of a rotated file, name.1.ext for name.ext
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+def rotated_indices(path: str) -> list[int]:
+    """
+    Indices of the rotated files of a path, oldest first
+    """
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(root) + r"\.(\d+)" + re.escape(ext) + "$")
+    indices: list[int] = []
+    for candidate in glob.glob(glob.escape(root) + ".*" + glob.escape(ext)):
+        match = pattern.match(candidate)
+        if match:
+            indices.append(int(match.group(1)))
+    return sorted(indices)
+
+
+def next_index(path: str) -> int:
+    """
+    Index of the next rotated file of a path
+    """
+    indices = rotated_indices(path)
+    return indices[-1] + 1 if indices else 1
@@ -0,0 +1,379 @@
+"""
+Append-only binary log of the received heartbeat readings
+
+Every reading is stored as a fixed-width record with its monotonic receive
+time, value and source. Run from the consumer directory to export the log
+to JSON:
+
+    python -m app.sessionlog export heartbeat.log --output heartbeat.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Any, BinaryIO, Iterator, Optional
+
+from app.plugins.base import Reading
+from app.rotation import next_index, rotated_indices, rotated_path
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ABTSLOG\x00"
+VERSION = 1
+# Magic, version and record size, followed by the sources table
+HEADER = struct.Struct("<8sHH")
+# Source names are stored in fixed-width slots of the sources table, the
+# last slot is shared by all sources that do not fit in the table
+MAX_SOURCES = 32
+SOURCE_SIZE = 32
+OTHER_SOURCE = "<other>"
+HEADER_SIZE = HEADER.size + MAX_SOURCES * SOURCE_SIZE
+# Time, value, source index and kind
+RECORD = struct.Struct("<dfHBx")
+
+# Record kinds. A session record starts a run of the consumer, its time is
+# the wall-clock time minus the monotonic time at the start, which turns the
+# monotonic times of the following readings into wall-clock times.
+READING = 0
+SESSION = 1
+
+
+class SessionLog:
+    """
+    Records readings to a binary log file from a background thread
+
+    Readings are packed into a preallocated buffer, which the thread appends
+    to the file and syncs to disk once per interval or as soon as the buffer
+    is half full, so logging a reading costs no I/O or allocation. Records
+    that do not fit while the thread falls behind are counted as dropped.
+    Logging continues an existing file. Once the file reaches the size limit
+    it is renamed to name.1.log, name.2.log and so on, and a new file is
+    started.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: Optional[int] = None,
+        flush_interval: float = 5.0,
+        buffer_size: int = 4096,
+    ) -> None:
+        """Create a session log.
+
+        Args:
+            path: Path to the log file
+            max_bytes: Size of a file after which the log is rotated
+            flush_interval: Time between two writes to disk in seconds
+            buffer_size: Number of records buffered between two writes
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.__lock = threading.Lock()
+        self.__write_lock = threading.Lock()
+        self.__stopped = threading.Event()
+        # Wakes the thread up before the interval has passed
+        self.__wake = threading.Event()
+        self.__thread = None
+        self.__buffer = bytearray(RECORD.size * buffer_size)
+        self.__count = 0
+        # Records dropped in total and since the last write
+        self.dropped = 0
+        self.__dropped = 0
+        # Names of the sources table and the slot of every source seen
+        self.__sources: list[str] = []
+        self.__slots: dict[str, int] = {}
+        self.__file: Optional[BinaryIO] = None
+
+    def start(self) -> None:
+        self.__file = self.__open()
+        offset = time.time() - time.monotonic()
+        with self.__lock:
+            self.__append(offset, 0.0, 0, SESSION)
+        self.__thread = threading.Thread(
+            name="session-log", target=self.__run, daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread, write the buffered records and close the file
+        """
+        self.__stopped.set()
+        self.__wake.set()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.flush()
+        with self.__write_lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+    def log(self, reading: Reading) -> None:
+        """
+        Record a reading without touching the disk
+        """
+        with self.__lock:
+            source = self.__slots.get(reading.source)
+            if source is None:
+                source = self.__add_source(reading.source)
+            self.__append(reading.timestamp, reading.value, source, READING)
+            half_full = 2 * self.__count * RECORD.size >= len(self.__buffer)
+        if half_full:
+            self.__wake.set()
+
+    def flush(self) -> None:
+        """
+        Append the buffered records to the file and sync it to disk
+        """
+        with self.__write_lock:
+            with self.__lock:
+                records = bytes(self.__buffer[: self.__count * RECORD.size])
+                self.__count = 0
+                sources = list(self.__sources)
+                dropped, self.__dropped = self.__dropped, 0
+            if dropped:
+                logger.warning(
+                    f"Dropped {dropped} records, the session log {self.path} "
+                    "fell behind"
+                )
+            if not records:
+                return
+
+            try:
+                self.__write(records, sources)
+            except OSError:
+                logger.exception(f"Failed to write the session log {self.path}")
+
+    def __append(self, timestamp: float, value: float, source: int, kind: int) -> None:
+        # The thread is woken up at half the buffer, if it falls behind
+        # until the buffer is full the newest record is overwritten
+        if self.__count * RECORD.size == len(self.__buffer):
+            self.__count -= 1
+            self.dropped += 1
+            self.__dropped += 1
+        RECORD.pack_into(
+            self.__buffer, self.__count * RECORD.size, timestamp, value, source, kind
+        )
+        self.__count += 1
+
+    def __add_source(self, name: str) -> int:
+        if len(self.__sources) < MAX_SOURCES - 1:
+            self.__slots[name] = len(self.__sources)
+            self.__sources.append(name)
+            return self.__slots[name]
+
+        if len(self.__sources) < MAX_SOURCES:
+            logger.warning(
+                f"Too many sources in the session log, logging {name} "
+                f"and later sources as {OTHER_SOURCE}"
+            )
+            self.__sources.append(OTHER_SOURCE)
+        self.__slots[name] = MAX_SOURCES - 1
+        return self.__slots[name]
+
+    def __open(self) -> BinaryIO:
+        """Open the log file for appending, creating it if it is not a valid log."""
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+            sources = read_header(header)
+        except (OSError, ValueError):
+            sources = None
+
+        if sources is None:
+            file = open(self.path, "wb")
+            file.write(pack_header(list(self.__sources)))
+            return file
+
+        # Keep the source indices of the records already in the file
+        for name in sources:
+            if name not in self.__slots:
+                self.__slots[name] = len(self.__sources)
+                self.__sources.append(name)
+        file = open(self.path, "r+b")
+        # Drop a partial record left by an interrupted write
+        size = file.seek(0, os.SEEK_END)
+        file.truncate(size - (size - HEADER_SIZE) % RECORD.size)
+        file.seek(0, os.SEEK_END)
+        return file
+
+    def __write(self, records: bytes, sources: list[str]) -> None:
+        file = self.__file
+        if file is None:
+            return
+        if self.max_bytes is not None and file.tell() + len(records) > self.max_bytes:
+            if file.tell() > HEADER_SIZE:
+                file.close()
+                os.replace(self.path, rotated_path(self.path, next_index(self.path)))
+                file = self.__file = open(self.path, "wb")
+                file.write(pack_header(sources))
+                # Start the new file with the current session
+                offset = time.time() - time.monotonic()
+                file.write(RECORD.pack(offset, 0.0, 0, SESSION))
+
+        file.write(records)
+        # Sources are only ever added, rewriting the table makes new ones known
+        position = file.tell()
+        file.seek(0)
+        file.write(pack_header(sources))
+        file.seek(position)
+        file.flush()
+        os.fsync(file.fileno())
+
+    def __run(self) -> None:
+        while not self.__stopped.is_set():
+            self.__wake.wait(self.flush_interval)
+            self.__wake.clear()
+            if not self.__stopped.is_set():
+                self.flush()
+
+
+def pack_header(sources: list[str]) -> bytes:
+    table = b"".join(
+        name.encode()[:SOURCE_SIZE].ljust(SOURCE_SIZE, b"\x00") for name in sources
+    )
+    return HEADER.pack(MAGIC, VERSION, RECORD.size) + table.ljust(
+        MAX_SOURCES * SOURCE_SIZE, b"\x00"
+    )
+
+
+def read_header(header: bytes) -> list[str]:
+    """
+    Source names of a log file header
+
+    Raises:
+        ValueError: If the header is not a valid log header
+    """
+    if len(header) < HEADER_SIZE:
+        raise ValueError("Truncated header")
+    magic, version, record_size = HEADER.unpack_from(header)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError("Not a session log")
+
+    sources: list[str] = []
+    for i in range(MAX_SOURCES):
+        start = HEADER.size + i * SOURCE_SIZE
+        name = header[start : start + SOURCE_SIZE].rstrip(b"\x00")
+        if not name:
+            break
+        sources.append(name.decode(errors="replace"))
+    return sources
+
+
+def log_files(path: str) -> list[str]:
+    """
+    Files of a log in the order they were written
+    """
+    files = [rotated_path(path, index) for index in rotated_indices(path)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_log(path: str) -> Iterator[tuple[float, float, str]]:
+    """
+    Wall-clock time, value and source of the readings of a log and its
+    rotated files
+    """
+    import numpy as np
+
+    dtype = np.dtype(
+        {
+            "names": ["time", "value", "source", "kind"],
+            "formats": ["<f8", "<f4", "<u2", "u1"],
+            "itemsize": RECORD.size,
+        }
+    )
+
+    for file in log_files(path):
+        with open(file, "rb") as f:
+            try:
+                sources = read_header(f.read(HEADER_SIZE))
+            except ValueError:
+                logger.warning(f"Skipping {file}, not a session log")
+                continue
+            data = f.read()
+        records = np.frombuffer(data[: len(data) - len(data) % RECORD.size], dtype)
+
+        # Carry the clock offset of every session record forward to its readings
+        session = records["kind"] == SESSION
+        last_session = np.maximum.accumulate(
+            np.where(session, np.arange(len(records)), -1)
+        )
+        readings = (records["kind"] == READING) & (last_session >= 0)
+        offsets = records["time"][last_session[readings]]
+        times = records["time"][readings] + offsets
+        values = records["value"][readings]
+        names = [*sources, "unknown"]
+        source_names: list[str] = [
+            names[min(index, len(names) - 1)] for index in records["source"][readings]
+        ]
+        yield from zip(times.tolist(), values.tolist(), source_names)
+
+
+def export_json(path: str, output: Any) -> int:
+    """Write the readings of a log as a JSON array of objects.
+
+    Args:
+        path: Path to the log file
+        output: Text file to write the JSON to
+
+    Returns:
+        Number of exported readings
+    """
+    # Formatted by hand, serializing every reading as a dict is several
+    # times slower
+    encoded: dict[str, str] = {}
+    count = 0
+    output.write("[")
+    for timestamp, value, source in read_log(path):
+        if source not in encoded:
+            encoded[source] = json.dumps(source)
+        output.write(
+            f'{"," if count else ""}\n  {{"timestamp": {timestamp:.3f}, '
+            f'"bpm": {value:g}, "source": {encoded[source]}}}'
+        )
+        count += 1
+    output.write("\n]\n" if count else "]\n")
+    return count
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(name)s\t%(message)s")
+
+    args_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = args_parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser(
+        "export", help="Export the readings of a log and its rotated files to JSON"
+    )
+    export_parser.add_argument("path", help="Path to the log file")
+    export_parser.add_argument(
+        "--output",
+        help="File to write the JSON to, standard output if omitted or -",
+        default="-",
+    )
+    args = args_parser.parse_args()
+
+    if args.output == "-":
+        export_json(args.path, sys.stdout)
+        return
+
+    # Written next to the target and renamed, so a fetch never sees a
+    # partially written export
+    temp_path = f"{args.output}.tmp"
+    with open(temp_path, "w") as f:
+        count = export_json(args.path, f)
+    os.replace(temp_path, args.output)
+    logger.info(f"Exported {count} readings to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from threading import Lock
-from typing import Any
+from typing import Any, TypeVar
+
+T = TypeVar("T")
 
 
 class SingletonMeta(type):
@@ -18,14 +20,9 @@ class SingletonMeta(type):
 
     _lock: Lock = Lock()
 
-    def __newl__(
-        cls,
-        name: str,
-        bases: tuple[type, ...],
-        namespace: dict[str, Any],
-    ) -> "SingletonMeta":
-        with cls._lock:
-            if cls not in cls._instances:
-                instance = super().__call__(name, bases, namespace)
-                cls._instances[cls] = instance
-        return cls._instances[cls]  # pyright: ignore[reportUnknownVariableType]
+    def __call__(cls: type[T], *args: Any, **kwargs: Any) -> T:
+        with SingletonMeta._lock:
+            if cls not in SingletonMeta._instances:
+                instance = super().__call__(*args, **kwargs)
+                SingletonMeta._instances[cls] = instance
+        return SingletonMeta._instances[cls]
@@ -1,4 +1,5 @@
 import logging
+from typing import Any
 
 import numpy as np
 from numpy.typing import NDArray
@@ -7,9 +8,30 @@ from pygame.mixer import get_init as mixer_get_init
 from pygame.mixer import init as mixer_init
 
 from app.singleton import SingletonMeta
+from app.sound.expression import (
+    Concat,
+    Operand,
+    Product,
+    SoundExpression,
+    Sum,
+    Wave,
+    expression,
+)
 
 logger = logging.getLogger(__name__)
 
+_rng = np.random.default_rng()
+
+# Sample data types of the mixer bit depths, negative bit depths are signed
+BIT_DEPTH_DTYPES: dict[int, type[np.integer[Any]]] = {
+    8: np.uint8,
+    -8: np.int8,
+    16: np.uint16,
+    -16: np.int16,
+    32: np.uint32,
+    -32: np.int32,
+}
+
 
 class ChannelParam(metaclass=SingletonMeta):
     """
@@ -39,6 +61,33 @@ class ChannelParam(metaclass=SingletonMeta):
     def count(self) -> int:
         return self.__channel_count
 
+    @property
+    def dtype(self) -> type[np.integer[Any]]:
+        """
+        Sample data type matching the bit depth
+        """
+        if self.__channel_bit_depth not in BIT_DEPTH_DTYPES:
+            raise ValueError("Unsupported bit depth")
+        return BIT_DEPTH_DTYPES[self.__channel_bit_depth]
+
+
+class LazyChannelParam:
+    """
+    Channel parameters of a class, created on first access
+
+    Importing sounds does not initialize the mixer, so their synthesis can be
+    used without an audio device when the framerate is given explicitly.
+    """
+
+    def __init__(self) -> None:
+        self.__channel_param: ChannelParam | None = None
+
+    def __get__(self, instance: object, owner: type) -> ChannelParam:
+        channel_param = self.__channel_param
+        if channel_param is None:
+            channel_param = self.__channel_param = ChannelParam()
+        return channel_param
+
 
 class ChannelAdapter(Sound):
     """
@@ -46,40 +95,92 @@ class ChannelAdapter(Sound):
     using numpy arrays for soundwave data
     """
 
-    channel_param: ChannelParam = ChannelParam()
-
-    def __init__(self, wave: NDArray[np.float32]) -> None:
-        # Resolve the appropriate data type for the bit depth
-        bit_depth_type_map = {
-            8: np.uint8,
-            -8: np.int8,
-            16: np.uint16,
-            -16: np.int16,
-            32: np.uint32,
-            -32: np.int32,
-        }
-        if self.channel_param.bit_depth not in bit_depth_type_map:
-            raise ValueError("Unsupported bit depth")
+    channel_param = LazyChannelParam()
 
-        self.dtype = bit_depth_type_map[self.channel_param.bit_depth]
+    def __init__(
+        self,
+        wave: NDArray[np.floating[Any]],
+        keep_wave: bool = True,
+        dither: bool = False,
+    ) -> None:
+        """Create a sound from a soundwave.
 
-        # Normalize the soundwave if it is not empty
-        if not np.all(wave == 0):
-            wave = self.normalize(wave)
+        Args:
+            wave: Soundwave, normalized to the full range of the bit depth
+            keep_wave: Keep the normalized float wave after the PCM conversion
+            dither: Add triangular dither before rounding to integer samples
+        """
+        self.dtype = self.channel_param.dtype
 
-        self.wave = wave
+        wave = self.normalize(wave)
+        pcm = self.to_pcm(wave, dither=dither, overwrite=not keep_wave)
+        self.__wave: NDArray[np.float32] | None = wave if keep_wave else None
 
-        # Extend the soundwave to the channel count
-        data = np.zeros(
-            (len(wave), self.channel_param.count),
-            dtype=bit_depth_type_map[self.channel_param.bit_depth],
-        )
-        for i in range(self.channel_param.count):
-            data[:, i] = self.wave
+        # pygame copies the samples from the buffer, the array can be released
+        super().__init__(buffer=pcm)
+
+    @property
+    def wave(self) -> NDArray[np.float32]:
+        """
+        Normalized float soundwave of the sound
+        """
+        if self.__wave is None:
+            raise RuntimeError("The float wave of this sound has been dropped")
+        return self.__wave
 
-        return super().__init__(data)
+    @wave.setter
+    def wave(self, wave: NDArray[np.float32]) -> None:
+        self.__wave = wave
 
-    def normalize(self, wave: NDArray[np.float32]) -> NDArray[np.float32]:
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory held by the PCM samples and the float wave in bytes
+        """
+        wave_bytes = 0 if self.__wave is None else self.__wave.nbytes
+        # Sound exports the buffer protocol, the pygame stubs omit it
+        pcm = memoryview(self)  # pyright: ignore[reportArgumentType]
+        return pcm.nbytes + wave_bytes
+
+    def drop_wave(self) -> None:
+        """
+        Release the float wave when only the PCM samples are needed
+        """
+        self.__wave = None
+
+    def to_pcm(
+        self,
+        wave: NDArray[np.float32],
+        dither: bool = False,
+        overwrite: bool = False,
+    ) -> NDArray[np.integer[Any]]:
+        """Convert a normalized soundwave to interleaved integer samples.
+
+        Samples are rounded to the nearest integer and clipped explicitly
+        to the range of the sample type.
+
+        Args:
+            wave: Normalized soundwave
+            dither: Add triangular dither before rounding
+            overwrite: Use the soundwave as scratch space instead of copying it
+        """
+        limits = np.iinfo(self.dtype)
+        samples = wave.astype(np.float32, copy=not overwrite)
+        if dither:
+            # Triangular dither with a peak amplitude of one quantization step
+            samples += _rng.random(len(samples), dtype=np.float32)
+            samples -= _rng.random(len(samples), dtype=np.float32)
+        np.rint(samples, out=samples)
+        np.clip(samples, limits.min, limits.max, out=samples)
+
+        # Cast once into the first channel, the others are integer copies of it
+        pcm = np.empty((len(samples), self.channel_param.count), dtype=self.dtype)
+        pcm[:, 0] = samples
+        for i in range(1, self.channel_param.count):
+            pcm[:, i] = pcm[:, 0]
+        return pcm
+
+    def normalize(self, wave: NDArray[np.floating[Any]]) -> NDArray[np.float32]:
         """
         Normalize the soundwave to the bit depth
         """
@@ -89,38 +190,48 @@ class ChannelAdapter(Sound):
 
         return self.normalize_range(wave, 0, max_bitrate)
 
+    @staticmethod
     def normalize_range(
-        self, wave: NDArray[np.float32], min: float, max: float
+        wave: NDArray[np.floating[Any]], min: float, max: float
     ) -> NDArray[np.float32]:
         """
         Normalize the soundwave to the range [min, max]
+
+        A soundwave without any variation, such as silence, is left as it is.
         """
-        diff = max - min
-        return (wave - np.min(wave)) / np.ptp(wave) * diff + min
+        wave_min, wave_max = np.min(wave), np.max(wave)
+        if wave_max == wave_min:
+            return wave.astype(np.float32)
+
+        scale = np.float32((max - min) / (wave_max - wave_min))
+        normalized = np.subtract(wave, wave_min, dtype=np.float32)
+        normalized *= scale
+        normalized += np.float32(min)
+        return normalized
 
-    def __add__(self, other: "ChannelAdapter") -> "ChannelAdapter":
+    def __add__(self, other: Operand) -> SoundExpression:
         return self.add(other)
 
-    def __mul__(self, other: "ChannelAdapter") -> "ChannelAdapter":
+    def __mul__(self, other: Operand) -> SoundExpression:
         return self.mul(other)
 
-    def __or__(self, other: "ChannelAdapter") -> "ChannelAdapter":
+    def __or__(self, other: Operand) -> SoundExpression:
         return self.concat(other)
 
-    def add(self, other: "ChannelAdapter") -> "ChannelAdapter":
+    def add(self, other: Operand) -> SoundExpression:
         """
-        Add two ChannelAdapter instances
+        Mix two sounds, evaluated lazily
         """
-        return ChannelAdapter(self.wave + other.wave)
+        return Sum([Wave(self.wave), expression(other)])
 
-    def mul(self, other: "ChannelAdapter") -> "ChannelAdapter":
+    def mul(self, other: Operand) -> SoundExpression:
         """
-        Multiply two ChannelAdapter instances
+        Multiply two sounds, evaluated lazily
         """
-        return ChannelAdapter(self.wave * other.wave)
+        return Product([Wave(self.wave), expression(other)])
 
-    def concat(self, other: "ChannelAdapter") -> "ChannelAdapter":
+    def concat(self, other: Operand) -> SoundExpression:
         """
-        Concatenate two ChannelAdapter instances
+        Concatenate two sounds, evaluated lazily
         """
-        return ChannelAdapter(np.concatenate((self.wave, other.wave)))
+        return Concat([Wave(self.wave), expression(other)])
@@ -0,0 +1,207 @@
+import hashlib
+import inspect
+import logging
+import os
+import struct
+import tempfile
+from types import ModuleType
+from typing import Any, Callable, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.sound import adapter, expression, filters, presets
+from app.sound.adapter import ChannelAdapter, ChannelParam
+
+logger = logging.getLogger(__name__)
+
+# Modules whose code determines the rendered samples
+SYNTHESIS_MODULES: tuple[ModuleType, ...] = (adapter, expression, filters, presets)
+
+
+def code_hash(preset: Callable[..., ChannelAdapter]) -> bytes:
+    """
+    Digest of the preset name and the synthesis code, changes whenever
+    either could change the rendered samples
+    """
+    digest = hashlib.sha256(preset_name(preset).encode())
+    for module in SYNTHESIS_MODULES:
+        digest.update(inspect.getsource(module).encode())
+    return digest.digest()
+
+
+def preset_name(preset: Callable[..., ChannelAdapter]) -> str:
+    return f"{preset.__module__}.{preset.__qualname__}"
+
+
+class WaveformBank:
+    """
+    Pre-rendered PCM beats of a preset for a BPM range in a memory-mapped file
+
+    The file starts with a header identifying the preset, the synthesis code
+    and the channel parameters it was rendered with, followed by an index of
+    the beats and their samples. Beats are read straight from the mapped file
+    without copying. A file that does not match the current preset, code or
+    mixer parameters is rebuilt.
+    """
+
+    MAGIC = b"ABTBANK\x00"
+    VERSION = 1
+    # Magic, version, lowest and highest BPM, framerate, bit depth,
+    # channel count, code hash and preset name
+    HEADER = struct.Struct("<8sIiiIiI32s64s")
+    # Byte offset and frame count of every beat
+    INDEX_DTYPE = np.dtype([("offset", "<u8"), ("frames", "<u8")])
+    ALIGNMENT = 64
+
+    def __init__(
+        self,
+        path: str,
+        preset: Callable[..., ChannelAdapter],
+        bpm_min: int = 40,
+        bpm_max: int = 200,
+    ) -> None:
+        """Create a waveform bank.
+
+        Args:
+            path: Path to the bank file
+            preset: Preset rendering the beats
+            bpm_min: Lowest BPM in the bank
+            bpm_max: Highest BPM in the bank
+        """
+        if not 0 < bpm_min <= bpm_max:
+            raise ValueError("BPM range must be positive and non-empty")
+
+        self.path = path
+        self.preset = preset
+        self.bpm_min = bpm_min
+        self.bpm_max = bpm_max
+        # The mapped file and its index, replaced together once loaded
+        self.__mapped: Optional[tuple[np.memmap[Any, Any], NDArray[Any]]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.__mapped is not None
+
+    def __contains__(self, bpm: int) -> bool:
+        return self.loaded and self.bpm_min <= bpm <= self.bpm_max
+
+    def pcm(self, bpm: int) -> Optional[NDArray[np.integer[Any]]]:
+        """
+        Samples of a beat with shape (frames, channels), None if not in the bank
+        """
+        mapped = self.__mapped
+        if mapped is None or not self.bpm_min <= bpm <= self.bpm_max:
+            return None
+
+        data, index = mapped
+        offset, frames = (int(value) for value in index[bpm - self.bpm_min])
+        channel_param = ChannelParam()
+        count = frames * channel_param.count
+        samples = data[offset : offset + count * np.dtype(channel_param.dtype).itemsize]
+        return samples.view(channel_param.dtype).reshape(frames, channel_param.count)
+
+    def load(self) -> bool:
+        """
+        Map the bank file if it matches the preset, code and mixer parameters
+
+        Returns:
+            True if the bank was loaded, False if it is missing or stale
+        """
+        try:
+            data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        except (OSError, ValueError):
+            return False
+
+        if len(data) < self.HEADER.size or data[: self.HEADER.size].tobytes() != (
+            self.__header()
+        ):
+            logger.info(f"Waveform bank {self.path} is stale")
+            return False
+
+        count = self.bpm_max - self.bpm_min + 1
+        index_end = self.HEADER.size + count * self.INDEX_DTYPE.itemsize
+        if len(data) < index_end:
+            logger.warning(f"Waveform bank {self.path} is truncated")
+            return False
+
+        index = data[self.HEADER.size : index_end].view(self.INDEX_DTYPE)
+        channel_param = ChannelParam()
+        frame_size = channel_param.count * np.dtype(channel_param.dtype).itemsize
+        if np.any(index["offset"] + index["frames"] * frame_size > len(data)):
+            logger.warning(f"Waveform bank {self.path} is truncated")
+            return False
+
+        self.__mapped = (data, index)
+        logger.info(f"Loaded waveform bank {self.path}")
+        return True
+
+    def build(self) -> None:
+        """
+        Render every beat of the BPM range and replace the bank file atomically
+        """
+        channel_param = ChannelParam()
+        count = self.bpm_max - self.bpm_min + 1
+        index = np.zeros(count, dtype=self.INDEX_DTYPE)
+        offset = self.__align(self.HEADER.size + index.nbytes)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for i, bpm in enumerate(range(self.bpm_min, self.bpm_max + 1)):
+                    sound = self.preset(bpm=bpm)
+                    # Sound exports the buffer protocol, the pygame stubs omit it
+                    pcm = memoryview(sound)  # pyright: ignore[reportArgumentType]
+                    f.seek(offset)
+                    f.write(pcm)
+                    index[i] = (offset, pcm.shape[0] if pcm.shape else 0)
+                    offset = self.__align(offset + pcm.nbytes)
+
+                # The header is written last, so an interrupted build is
+                # never mistaken for a complete bank
+                f.seek(0)
+                f.write(self.__header(channel_param))
+                f.write(index.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+        logger.info(
+            f"Built waveform bank {self.path} ({os.path.getsize(self.path)} bytes)"
+        )
+
+    def load_or_build(self) -> None:
+        """
+        Map the bank file, building it first if it is missing or stale
+        """
+        if not self.load():
+            self.build()
+            if not self.load():
+                raise RuntimeError(f"Failed to load waveform bank {self.path}")
+
+    def __header(self, channel_param: Optional[ChannelParam] = None) -> bytes:
+        if channel_param is None:
+            channel_param = ChannelParam()
+        return self.HEADER.pack(
+            self.MAGIC,
+            self.VERSION,
+            self.bpm_min,
+            self.bpm_max,
+            channel_param.framerate,
+            channel_param.bit_depth,
+            channel_param.count,
+            code_hash(self.preset),
+            preset_name(self.preset).encode()[:64],
+        )
+
+    def __align(self, offset: int) -> int:
+        return -(-offset // self.ALIGNMENT) * self.ALIGNMENT
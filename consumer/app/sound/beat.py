@@ -0,0 +1,178 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Union
+
+import numpy as np
+from numpy.typing import NDArray
+from pygame.mixer import Sound
+
+from app.sound.adapter import ChannelParam
+from app.sound.filters import butter_sos, sosfilt
+from app.sound.noise import DeepBrownNoiseStream
+from app.sound.presets import heartbeat_envelope
+
+
+class Beat(ABC):
+    """
+    A single beat period, read by the loop player as a ring buffer
+
+    Beats render float frames on the PCM sample scale, the player rounds and
+    clips them to the sample format.
+    """
+
+    @property
+    @abstractmethod
+    def frames(self) -> int:
+        """
+        Length of the beat period in frames
+        """
+        pass
+
+    @abstractmethod
+    def render(self, start: int, out: NDArray[np.float32]) -> None:
+        """
+        Write len(out) frames of the beat starting from the given frame
+        """
+        pass
+
+
+class PCMBeat(Beat):
+    """
+    Beat playing the PCM samples of a rendered sound
+
+    The samples are read without copying, either from a sound or from an
+    array such as a beat of a memory-mapped waveform bank.
+    """
+
+    def __init__(self, sound: Union[Sound, NDArray[np.integer[Any]]]) -> None:
+        # Zero-copy view of the samples with shape (frames, channels). Sound
+        # exports the buffer protocol, which the pygame stubs do not declare.
+        self.pcm: NDArray[np.integer[Any]] = (
+            np.asarray(memoryview(sound))  # pyright: ignore[reportArgumentType]
+            if isinstance(sound, Sound)
+            else sound
+        )
+        if self.pcm.ndim == 1:
+            self.pcm = self.pcm[:, np.newaxis]
+
+    @property
+    def frames(self) -> int:
+        return len(self.pcm)
+
+    def render(self, start: int, out: NDArray[np.float32]) -> None:
+        out[:] = self.pcm[start : start + len(out)]
+
+
+class LiveBeat(Beat):
+    """
+    Beat synthesized while it is played
+
+    Noise from a stream is multiplied by the beat envelope block by block, so
+    every beat gets fresh noise and no full-length noise buffer is rendered.
+    Frames must be rendered in playback order, as the noise stream and the
+    high-pass filter carry their state from one block to the next. Live
+    heartbeats of a framerate share one noise stream, which carries over
+    from beat to beat. The gain is set from the loudness of the high-passed
+    noise, measured once per framerate, and the loudness of the envelope, as
+    the peak of the whole signal is never known.
+    """
+
+    HIGHPASS_CUTOFF = 50.0
+    CALIBRATION_SECONDS = 4.0
+    BLOCK_SIZE = 1024
+    # Fresh noise makes every beat peak differently, beats peak at up to
+    # about 19 times the RMS of the enveloped noise
+    CREST_FACTOR = 20.0
+
+    # Shared noise stream and RMS of its high-passed signal per framerate
+    __noise: dict[int, tuple[DeepBrownNoiseStream, float]] = {}
+    __noise_lock = threading.Lock()
+
+    def __init__(
+        self,
+        envelope: NDArray[np.float32],
+        noise: DeepBrownNoiseStream,
+        noise_rms: float,
+    ) -> None:
+        """Create a live beat.
+
+        Args:
+            envelope: Envelope of a single beat period with a peak of 1.0
+            noise: Noise stream modulated by the envelope
+            noise_rms: RMS of the noise after the high-pass filter of the beat
+        """
+        channel_param = ChannelParam()
+        max_amplitude = (1 << (abs(channel_param.bit_depth) - 1)) - 1
+        if channel_param.bit_depth < 0:
+            self.__scale, self.__offset = max_amplitude, 0.0
+        else:
+            self.__scale, self.__offset = max_amplitude / 2, max_amplitude / 2
+
+        self.envelope = envelope
+        self.noise = noise
+        self.__sos = butter_sos(
+            "high", 1, self.HIGHPASS_CUTOFF, channel_param.framerate
+        )
+        self.__highpass_state = np.zeros((len(self.__sos), 2))
+        self.__block = np.empty(0, dtype=np.float32)
+
+        # The envelope varies slowly next to the noise, the RMS of their
+        # product is close to the product of their RMS values
+        envelope_rms = float(np.sqrt(np.mean(np.square(envelope, dtype=np.float64))))
+        rms = noise_rms * envelope_rms
+        self.__gain = 1.0 / (self.CREST_FACTOR * rms) if rms > 0 else 1.0
+
+    @classmethod
+    def heartbeat(cls, bpm: float) -> "LiveBeat":
+        """
+        Live heartbeat with the lub-dub envelope of RealisticHeartbeatSound
+        """
+        framerate = ChannelParam().framerate
+        noise, noise_rms = cls.shared_noise(framerate)
+        return cls(heartbeat_envelope(round(bpm), framerate), noise, noise_rms)
+
+    @classmethod
+    def shared_noise(cls, framerate: int) -> tuple[DeepBrownNoiseStream, float]:
+        """
+        Noise stream shared by the live beats of a framerate and the RMS of its
+        high-passed signal, calibrated on first use in blocks
+        """
+        with cls.__noise_lock:
+            if framerate not in cls.__noise:
+                stream = DeepBrownNoiseStream(framerate, block_size=cls.BLOCK_SIZE)
+                sos = butter_sos("high", 1, cls.HIGHPASS_CUTOFF, framerate)
+                state = np.zeros((len(sos), 2))
+                block = np.empty(cls.BLOCK_SIZE, dtype=np.float32)
+                count = round(cls.CALIBRATION_SECONDS * framerate / cls.BLOCK_SIZE)
+                energy = 0.0
+                for _ in range(count):
+                    stream.read(block)
+                    filtered, state = sosfilt(sos, block, zi=state)
+                    energy += float(np.dot(filtered, filtered))
+                rms = float(np.sqrt(energy / (count * cls.BLOCK_SIZE)))
+                cls.__noise[framerate] = (stream, rms)
+            return cls.__noise[framerate]
+
+    @property
+    def frames(self) -> int:
+        return len(self.envelope)
+
+    def render(self, start: int, out: NDArray[np.float32]) -> None:
+        wave = self.__synthesize(start, len(out))
+        wave *= self.__gain * self.__scale
+        wave += self.__offset
+
+        # The same samples go to every channel
+        out[:] = wave[:, np.newaxis]
+
+    def __synthesize(self, start: int, count: int) -> NDArray[np.float64]:
+        if len(self.__block) < count:
+            self.__block = np.empty(count, dtype=np.float32)
+        block = self.__block[:count]
+
+        self.noise.read(block)
+        block *= self.envelope[start : start + count]
+        filtered, self.__highpass_state = sosfilt(
+            self.__sos, block, zi=self.__highpass_state
+        )
+        return filtered
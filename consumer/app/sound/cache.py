@@ -0,0 +1,157 @@
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, TypeVar
+
+from app.sound.adapter import ChannelAdapter, ChannelParam
+
+logger = logging.getLogger(__name__)
+
+SoundT = TypeVar("SoundT", bound=ChannelAdapter)
+
+CacheKey = tuple[object, ...]
+
+
+class WaveformCache:
+    """
+    Bounded LRU cache of rendered sounds keyed by preset, BPM and channel parameters
+
+    Rendering a preset runs its whole DSP pipeline, so sounds for BPM values
+    that have already been seen are kept around until the memory limit is hit.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        bpm_step: int = 1,
+        keep_waves: bool = True,
+    ) -> None:
+        """Create a waveform cache.
+
+        Args:
+            max_bytes: Upper bound for the memory held by cached sounds
+            bpm_step: BPM values are quantized to multiples of this step
+            keep_waves: Keep the float waves of cached sounds, only the PCM
+                samples are kept otherwise
+        """
+        if bpm_step < 1:
+            raise ValueError("BPM step must be a positive integer")
+
+        self.max_bytes = max_bytes
+        self.bpm_step = bpm_step
+        self.keep_waves = keep_waves
+        self.hits = 0
+        self.misses = 0
+
+        self.__entries: OrderedDict[CacheKey, tuple[ChannelAdapter, int]] = (
+            OrderedDict()
+        )
+        self.__size = 0
+        self.__lock = Lock()
+
+    @property
+    def size(self) -> int:
+        """Memory held by the cached sounds in bytes"""
+        return self.__size
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def quantize(self, bpm: float) -> int:
+        """
+        Quantize a BPM value to the cache resolution
+        """
+        return max(self.bpm_step, round(bpm / self.bpm_step) * self.bpm_step)
+
+    def key(self, preset: Callable[..., ChannelAdapter], bpm: int) -> CacheKey:
+        """
+        Build the cache key of a preset rendered at the given BPM
+        """
+        channel_param = ChannelParam()
+        return (
+            preset,
+            bpm,
+            channel_param.framerate,
+            channel_param.bit_depth,
+            channel_param.count,
+        )
+
+    def get(self, preset: Callable[..., SoundT], bpm: float) -> SoundT:
+        """
+        Return the preset rendered at the given BPM, rendering it on a miss
+        """
+        bpm = self.quantize(bpm)
+        key = self.key(preset, bpm)
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]  # pyright: ignore[reportReturnType]
+            self.misses += 1
+
+        # Render outside of the lock, a concurrent miss for the same key
+        # only costs a redundant render
+        sound = preset(bpm=bpm)
+        self.__insert(key, sound)
+        return sound
+
+    def warm_up(self, preset: Callable[..., ChannelAdapter], bpm_range: range) -> int:
+        """
+        Pre-render the preset for every BPM in the range
+
+        Warm-up stops once the cache is full so that it never evicts
+        entries it has rendered itself.
+
+        Returns:
+            Number of sounds rendered
+        """
+        rendered = 0
+        for bpm in bpm_range:
+            bpm = self.quantize(bpm)
+            key = self.key(preset, bpm)
+            with self.__lock:
+                if key in self.__entries:
+                    continue
+
+            sound = preset(bpm=bpm)
+            if not self.keep_waves:
+                sound.drop_wave()
+            if self.__size + sound.nbytes > self.max_bytes:
+                logger.info(f"Cache full, stopping warm-up at {bpm} BPM")
+                break
+
+            self.__insert(key, sound)
+            rendered += 1
+
+        logger.info(f"Warmed up {rendered} sounds ({self.__size} bytes)")
+        return rendered
+
+    def clear(self) -> None:
+        """
+        Remove all cached sounds
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+
+    def __insert(self, key: CacheKey, sound: ChannelAdapter) -> None:
+        if not self.keep_waves:
+            sound.drop_wave()
+
+        size = sound.nbytes
+        if size > self.max_bytes:
+            return
+
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__size -= previous[1]
+
+            self.__entries[key] = (sound, size)
+            self.__size += size
+
+            while self.__size > self.max_bytes:
+                _, (_, evicted_size) = self.__entries.popitem(last=False)
+                self.__size -= evicted_size
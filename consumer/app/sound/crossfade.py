@@ -0,0 +1,53 @@
+"""
+Crossfade between an outgoing and an incoming beat
+
+Kept free of the mixer, so that the offline renderer shares the curves of
+live playback without loading pygame for them.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from numpy.typing import NDArray
+
+MIN_CROSSFADE = 500  # Minimum 11ms at 44.1kHz
+MAX_CROSSFADE = 4000  # Maximum 91ms at 44.1kHz
+
+
+@lru_cache(maxsize=32)
+def crossfade_curves(length: int) -> tuple[NDArray[np.float32], NDArray[np.float32]]:
+    """Equal-power fade-in and fade-out curves as (length, 1) column vectors.
+
+    The curves are a quarter period of sine and cosine, their squares sum to
+    one, so the power of two uncorrelated signals stays constant.
+
+    Args:
+        length: Length of the crossfade in frames
+    """
+    angle = np.linspace(0, np.pi / 2, length, dtype=np.float32)[:, np.newaxis]
+    fade_in = np.sin(angle).astype(np.float32)
+    fade_out = np.cos(angle).astype(np.float32)
+    fade_in.setflags(write=False)
+    fade_out.setflags(write=False)
+    return fade_in, fade_out
+
+
+def crossfade_length(
+    outgoing: int,
+    incoming: int,
+    percentage: float = 0.10,
+    minimum: int = MIN_CROSSFADE,
+    maximum: int = MAX_CROSSFADE,
+) -> int:
+    """Crossfade length in frames for a transition between two beats.
+
+    Args:
+        outgoing: Length of the outgoing beat in frames
+        incoming: Length of the incoming beat in frames
+        percentage: Crossfade length relative to the shorter beat
+        minimum: Minimum crossfade length in frames
+        maximum: Maximum crossfade length in frames
+    """
+    shortest = min(outgoing, incoming)
+    length = max(minimum, min(int(shortest * percentage), maximum))
+    return min(length, shortest // 2)
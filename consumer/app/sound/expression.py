@@ -0,0 +1,194 @@
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Union
+
+import numpy as np
+from numpy.typing import NDArray
+from pygame.mixer import Channel
+
+if TYPE_CHECKING:
+    from app.sound.adapter import ChannelAdapter
+
+Operand = Union["SoundExpression", "ChannelAdapter"]
+
+
+class SoundExpression(ABC):
+    """
+    Lazily evaluated soundwave built from sound arithmetic
+
+    Sums, products and concatenations only record their operands. The whole
+    expression is evaluated into a single float buffer, and converted to PCM
+    once, when the sound is played or exported.
+    """
+
+    def __init__(self) -> None:
+        self.__sound: "ChannelAdapter | None" = None
+
+    @property
+    @abstractmethod
+    def length(self) -> int:
+        """
+        Length of the soundwave in samples
+        """
+        pass
+
+    @abstractmethod
+    def evaluate_into(self, out: NDArray[np.float32]) -> None:
+        """
+        Write the soundwave into a buffer of the expression length
+        """
+        pass
+
+    def evaluate(self) -> NDArray[np.float32]:
+        """
+        Evaluate the soundwave into a new buffer
+        """
+        out = np.empty(self.length, dtype=np.float32)
+        self.evaluate_into(out)
+        return out
+
+    def to_sound(self) -> "ChannelAdapter":
+        """
+        Evaluate the expression into a sound, the sound is reused on later calls
+        """
+        if self.__sound is None:
+            # Imported here, the adapter module builds expressions itself
+            from app.sound.adapter import ChannelAdapter
+
+            self.__sound = ChannelAdapter(self.evaluate())
+        return self.__sound
+
+    def play(self, *args: Any, **kwargs: Any) -> Channel:
+        """
+        Play the evaluated sound, see pygame.mixer.Sound.play
+        """
+        return self.to_sound().play(*args, **kwargs)
+
+    def get_raw(self) -> bytes:
+        """
+        PCM samples of the evaluated sound
+        """
+        return self.to_sound().get_raw()
+
+    def __add__(self, other: Operand) -> "SoundExpression":
+        return Sum([self, expression(other)])
+
+    def __mul__(self, other: Operand) -> "SoundExpression":
+        return Product([self, expression(other)])
+
+    def __or__(self, other: Operand) -> "SoundExpression":
+        return Concat([self, expression(other)])
+
+
+class Wave(SoundExpression):
+    """
+    Expression leaf holding an evaluated soundwave
+    """
+
+    def __init__(self, wave: NDArray[np.floating[Any]]) -> None:
+        super().__init__()
+        self.wave = wave
+
+    @property
+    def length(self) -> int:
+        return len(self.wave)
+
+    def evaluate_into(self, out: NDArray[np.float32]) -> None:
+        out[:] = self.wave
+
+
+class Operation(SoundExpression):
+    """
+    Expression combining several operands
+    """
+
+    def __init__(self, operands: list[SoundExpression]) -> None:
+        super().__init__()
+        # Nested operations of the same kind are merged into one
+        self.operands: list[SoundExpression] = []
+        for operand in operands:
+            if isinstance(operand, Operation) and type(operand) is type(self):
+                self.operands.extend(operand.operands)
+            else:
+                self.operands.append(operand)
+
+    def operand_wave(
+        self, operand: SoundExpression, scratch: list[NDArray[np.float32]]
+    ) -> NDArray[Any]:
+        """
+        Soundwave of an operand, evaluated into a shared scratch buffer if needed
+        """
+        if isinstance(operand, Wave):
+            return operand.wave
+        if not scratch:
+            scratch.append(np.empty(self.length, dtype=np.float32))
+        out = scratch[0][: operand.length]
+        operand.evaluate_into(out)
+        return out
+
+
+class Sum(Operation):
+    """
+    Mix of soundwaves, shorter soundwaves are mixed into the start of the longest
+    """
+
+    @property
+    def length(self) -> int:
+        return max(operand.length for operand in self.operands)
+
+    def evaluate_into(self, out: NDArray[np.float32]) -> None:
+        first, *rest = self.operands
+        first.evaluate_into(out[: first.length])
+        out[first.length :] = 0
+
+        scratch: list[NDArray[np.float32]] = []
+        for operand in rest:
+            wave = self.operand_wave(operand, scratch)
+            np.add(out[: len(wave)], wave, out=out[: len(wave)])
+
+
+class Product(Operation):
+    """
+    Sample-wise product of soundwaves of equal length
+    """
+
+    def __init__(self, operands: list[SoundExpression]) -> None:
+        super().__init__(operands)
+        if len({operand.length for operand in self.operands}) > 1:
+            raise ValueError("Multiplied sounds must be of equal length")
+
+    @property
+    def length(self) -> int:
+        return self.operands[0].length
+
+    def evaluate_into(self, out: NDArray[np.float32]) -> None:
+        first, *rest = self.operands
+        first.evaluate_into(out)
+
+        scratch: list[NDArray[np.float32]] = []
+        for operand in rest:
+            np.multiply(out, self.operand_wave(operand, scratch), out=out)
+
+
+class Concat(Operation):
+    """
+    Soundwaves played one after another
+    """
+
+    @property
+    def length(self) -> int:
+        return sum(operand.length for operand in self.operands)
+
+    def evaluate_into(self, out: NDArray[np.float32]) -> None:
+        start = 0
+        for operand in self.operands:
+            operand.evaluate_into(out[start : start + operand.length])
+            start += operand.length
+
+
+def expression(operand: Operand) -> SoundExpression:
+    """
+    Expression of a sound, sounds are wrapped as expression leaves
+    """
+    if isinstance(operand, SoundExpression):
+        return operand
+    return Wave(operand.wave)
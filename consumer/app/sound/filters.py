@@ -0,0 +1,79 @@
+from functools import lru_cache
+from typing import Any, Literal, overload
+
+import numpy as np
+from numpy.typing import NDArray
+
+FilterType = Literal["low", "high"]
+
+
+def _signal() -> Any:
+    """
+    scipy.signal, imported on first use as importing it takes longer than
+    starting the rest of the application
+    """
+    from scipy import signal  # pyright: ignore[reportMissingTypeStubs]
+
+    return signal
+
+
+@lru_cache(maxsize=64)
+def butter_sos(
+    btype: FilterType, order: int, cutoff: float, framerate: int
+) -> NDArray[np.float64]:
+    """Butterworth filter in second-order sections, designed once per parameters.
+
+    Args:
+        btype: Type of the filter
+        order: Order of the filter
+        cutoff: Cutoff frequency in Hz
+        framerate: Framerate of the filtered signal
+    """
+    signal = _signal()
+    sos: NDArray[np.float64] = signal.butter(  # pyright: ignore
+        order, cutoff / (framerate / 2), btype=btype, output="sos"
+    )
+    sos.setflags(write=False)
+    return sos
+
+
+@overload
+def sosfilt(sos: NDArray[np.float64], wave: NDArray[Any]) -> NDArray[np.float64]: ...
+
+
+@overload
+def sosfilt(
+    sos: NDArray[np.float64], wave: NDArray[Any], zi: NDArray[np.float64]
+) -> tuple[NDArray[np.float64], NDArray[np.float64]]: ...
+
+
+def sosfilt(
+    sos: NDArray[np.float64],
+    wave: NDArray[Any],
+    zi: NDArray[np.float64] | None = None,
+) -> NDArray[np.float64] | tuple[NDArray[np.float64], NDArray[np.float64]]:
+    """
+    Filter a soundwave forward with second-order sections, see scipy.signal.sosfilt
+
+    Given the initial filter state zi, the final state is returned with the
+    filtered soundwave.
+    """
+    # scipy requires writable sections, the cached design is read-only
+    if zi is None:
+        return _signal().sosfilt(sos.copy(), wave)  # pyright: ignore
+    return _signal().sosfilt(sos.copy(), wave, zi=zi)  # pyright: ignore
+
+
+def sosfiltfilt(sos: NDArray[np.float64], wave: NDArray[Any]) -> NDArray[np.float64]:
+    """
+    Filter a soundwave forward and backward with second-order sections for zero
+    phase, see scipy.signal.sosfiltfilt
+    """
+    return _signal().sosfiltfilt(sos.copy(), wave)  # pyright: ignore
+
+
+def lfilter(b: Any, a: Any, wave: NDArray[Any], **kwargs: Any) -> Any:
+    """
+    Filter a soundwave with an IIR or FIR filter, see scipy.signal.lfilter
+    """
+    return _signal().lfilter(b, a, wave, **kwargs)  # pyright: ignore
@@ -0,0 +1,70 @@
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.sound.filters import butter_sos, lfilter, sosfilt
+
+
+class DeepBrownNoiseStream:
+    """
+    Deep brown noise generated block by block
+
+    The same filters as in DeepBrownNoise are applied, carrying their state
+    from one block to the next so the blocks join into a continuous signal.
+    The low-pass filter runs forward only, a zero-phase filter would need the
+    whole signal. The noise is scaled by the peak of a calibration run, as
+    the peak of the whole signal is never known. Noise is generated at most
+    block_size samples at a time, so no full-length buffer is allocated.
+    """
+
+    DECAY = 0.98
+    GAIN = 0.1
+    CUTOFF = 150.0
+
+    def __init__(
+        self, framerate: int, calibration: float = 1.0, block_size: int = 1024
+    ) -> None:
+        """Create a deep brown noise stream.
+
+        Args:
+            framerate: Framerate of the generated noise
+            calibration: Duration of the noise generated up front in seconds,
+                used to settle the filters and to measure the noise peak
+            block_size: Largest number of samples generated at once
+        """
+        self.block_size = block_size
+        self.__rng = np.random.default_rng()
+        self.__sos = butter_sos("low", 3, self.CUTOFF, framerate)
+        self.__brown_state = np.zeros(1)
+        self.__lowpass_state = np.zeros((len(self.__sos), 2))
+        self.__white = np.empty(block_size)
+        self.__scale = 1.0
+
+        peak = 0.0
+        for remaining in range(round(calibration * framerate), 0, -block_size):
+            block = self.__generate(min(remaining, block_size))
+            peak = max(peak, float(np.max(np.abs(block))))
+        if peak > 0:
+            self.__scale = 1.0 / peak
+
+    def read(self, out: NDArray[np.floating[Any]]) -> None:
+        """
+        Write the next len(out) samples of the noise, scaled to a peak of about 1.0
+        """
+        for start in range(0, len(out), self.block_size):
+            chunk = out[start : start + self.block_size]
+            np.multiply(self.__generate(len(chunk)), self.__scale, out=chunk)
+
+    def __generate(self, count: int) -> NDArray[np.float64]:
+        white = self.__white[:count]
+        self.__rng.standard_normal(out=white)
+
+        brown: NDArray[np.float64]
+        brown, self.__brown_state = lfilter(
+            [self.GAIN], [1.0, -self.DECAY], white, zi=self.__brown_state
+        )
+        filtered, self.__lowpass_state = sosfilt(
+            self.__sos, brown, zi=self.__lowpass_state
+        )
+        return filtered
@@ -1,13 +1,28 @@
+import logging
 import os
+import struct
 import threading
-import wave
-from datetime import datetime
+import time
 from enum import Enum
-from typing import Optional
+from queue import Empty, Full, Queue
+from typing import Any, BinaryIO, Optional, Union
 
 import numpy as np
-from pygame.mixer import Sound
-from pygame.time import wait
+from numpy.typing import NDArray
+from pygame.mixer import Channel, Sound, set_reserved
+
+from app.metrics import Metrics
+from app.rotation import rotated_indices, rotated_path
+from app.sound.adapter import ChannelParam
+from app.sound.beat import Beat, PCMBeat
+from app.sound.crossfade import (
+    MAX_CROSSFADE,
+    MIN_CROSSFADE,
+    crossfade_curves,
+    crossfade_length,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class PlayerState(Enum):
@@ -17,126 +32,495 @@ class PlayerState(Enum):
 
 
 class WavRecorder:
+    """
+    Records played audio to WAV files from a background thread
+
+    The file is kept open and frames are appended as they arrive, the RIFF
+    header sizes are patched on every flush and when the file is closed.
+    Recording rotates to a new file once the size or duration limit of the
+    current one is reached, and always before the 4 GiB limit of the 32-bit
+    WAV sizes. Frames are dropped rather than blocking the caller if the
+    writer falls behind. Files of an earlier recording to the same name are
+    removed when recording starts.
+    """
+
+    HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+    # Largest data size that the RIFF size field can describe
+    MAX_DATA_SIZE = 0xFFFFFFFF - (HEADER.size - 8)
+
     def __init__(
         self,
         channel_bit_depth: int,
         channel_frame_rate: int,
         channel_count: int,
         filename: str,
+        max_bytes: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        flush_interval: float = 1.0,
+        queue_size: int = 256,
     ):
+        """Create a WAV recorder.
+
+        Args:
+            channel_bit_depth: Bit depth of the samples
+            channel_frame_rate: Frames per second
+            channel_count: Number of channels
+            filename: Path of the first file, rotated files are numbered
+                as name.1.wav, name.2.wav and so on
+            max_bytes: Maximum audio data size of a single file, capped to
+                the WAV size limit
+            max_seconds: Maximum duration of a single file
+            flush_interval: Time between header updates in seconds
+            queue_size: Number of pending writes before frames are dropped
+        """
         self.channel_bit_depth = channel_bit_depth
         self.channel_frame_rate = channel_frame_rate
         self.channel_count = channel_count
         self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self.__queue: Queue[Optional[bytes]] = Queue(maxsize=queue_size)
+        self.__file: Optional[BinaryIO] = None
+        self.__index = 0
+        self.__data_size = 0
+        self.__error: Optional[BaseException] = None
+
+        for index in rotated_indices(self.filename):
+            os.remove(rotated_path(self.filename, index))
         if os.path.exists(self.filename):
             os.remove(self.filename)
 
-    def record(self, sound: Sound) -> None:
-        frames = sound.get_raw()
-        if os.path.exists(self.filename):
-            with wave.open(self.filename, "rb") as file:
-                frames = file.readframes(file.getnframes()) + frames
+        self.__thread = threading.Thread(
+            name="wav-recorder", target=self.__run, daemon=True
+        )
+        self.__thread.start()
+
+    def record(self, sound: Union[Sound, bytes, NDArray[Any]]) -> None:
+        """
+        Append the frames of a sound or a PCM buffer to the recording
+        """
+        if self.__error is not None:
+            self.dropped += 1
+            return
+
+        if isinstance(sound, Sound):
+            frames = sound.get_raw()
+        elif isinstance(sound, bytes):
+            frames = sound
+        else:
+            frames = sound.tobytes()
 
-        with wave.open(self.filename, "wb") as file:
-            file.setnchannels(self.channel_count)
-            file.setsampwidth(self.sample_width)
-            file.setframerate(self.channel_frame_rate)
-            file.writeframes(frames)
+        try:
+            self.__queue.put_nowait(frames)
+        except Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """
+        Write the pending frames and close the current file
+
+        Raises:
+            RuntimeError: If the writer thread failed
+        """
+        if self.__error is None and self.__thread.is_alive():
+            self.__queue.put(None)
+        self.__thread.join()
+        if self.__error is not None:
+            raise RuntimeError(
+                f"Recording to {self.__path()} failed, {self.dropped} frames dropped"
+            ) from self.__error
 
     @property
     def sample_width(self):
         return abs(self.channel_bit_depth) // 8
 
+    @property
+    def frame_size(self) -> int:
+        return self.sample_width * self.channel_count
+
+    def __path(self) -> str:
+        if self.__index == 0:
+            return self.filename
+        return rotated_path(self.filename, self.__index)
+
+    def __header(self) -> bytes:
+        return self.HEADER.pack(
+            b"RIFF",
+            self.HEADER.size - 8 + self.__data_size,
+            b"WAVE",
+            b"fmt ",
+            16,
+            1,  # PCM
+            self.channel_count,
+            self.channel_frame_rate,
+            self.channel_frame_rate * self.frame_size,
+            self.frame_size,
+            self.sample_width * 8,
+            b"data",
+            self.__data_size,
+        )
+
+    def __open(self) -> BinaryIO:
+        file = open(self.__path(), "wb")
+        self.__data_size = 0
+        file.write(self.__header())
+        return file
+
+    def __flush(self, file: BinaryIO) -> None:
+        """Patch the header sizes and flush the written frames."""
+        position = file.tell()
+        file.seek(0)
+        file.write(self.__header())
+        file.seek(position)
+        file.flush()
+
+    def __should_rotate(self, size: int) -> bool:
+        if self.__data_size == 0:
+            return False
+        max_bytes = self.MAX_DATA_SIZE - self.MAX_DATA_SIZE % self.frame_size
+        if self.max_bytes is not None:
+            max_bytes = min(max_bytes, self.max_bytes)
+        if self.__data_size + size > max_bytes:
+            return True
+        if self.max_seconds is not None:
+            frames = self.__data_size // self.frame_size
+            return frames >= self.max_seconds * self.channel_frame_rate
+        return False
+
+    def __write(self, frames: bytes) -> None:
+        if self.__file is None:
+            self.__file = self.__open()
+        elif self.__should_rotate(len(frames)):
+            self.__flush(self.__file)
+            self.__file.close()
+            self.__index += 1
+            self.__file = self.__open()
+
+        self.__file.write(frames)
+        self.__data_size += len(frames)
+
+    def __record(self) -> None:
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                frames = self.__queue.get(
+                    timeout=max(0.0, next_flush - time.monotonic())
+                )
+            except Empty:
+                frames = b""
+
+            if frames is None:
+                break
+            if frames:
+                self.__write(frames)
+
+            if time.monotonic() >= next_flush:
+                if self.__file is not None:
+                    self.__flush(self.__file)
+                next_flush = time.monotonic() + self.flush_interval
+
+    def __run(self) -> None:
+        try:
+            self.__record()
+            if self.__file is not None:
+                self.__flush(self.__file)
+        except Exception as e:
+            # Later frames are dropped, the error is raised again on close
+            logger.exception(f"Recording to {self.__path()} failed")
+            self.__error = e
+        finally:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+
+def queue_empty(channel: Channel) -> bool:
+    """
+    Whether no sound is queued on a channel
+    """
+    # get_queue() returns None for an empty queue, the pygame stubs omit it
+    return channel.get_queue() is None  # pyright: ignore[reportUnnecessaryComparison]
+
 
 class LoopPlayer:
     """
     Loop player repeats a sound indefinitely until it is stopped
+
+    Audio is streamed to a reserved mixer channel in fixed-size blocks,
+    keeping one block playing and one queued. Blocks are cut from the
+    current beat, which wraps around at its end, so consecutive beats are
+    played back-to-back on the sample clock without gaps or overlaps.
+    A new sound takes over at the next beat boundary. With retiming enabled,
+    the next beat boundary is moved to one period of the new sound after
+    the start of the current beat as soon as the new sound arrives, trimming
+    the current beat or holding its last frame, so a BPM change is heard
+    within a block instead of after the rest of the current period. With
+    crossfading enabled, the start of the incoming beat is mixed with the
+    continuation of the outgoing loop so that the transition is free of clicks.
     """
 
+    min_crossfade = MIN_CROSSFADE
+    max_crossfade = MAX_CROSSFADE
+
     def __init__(
         self,
         sound: Optional[Sound] = None,
         recorder: Optional[WavRecorder] = None,
+        block_size: int = 1024,
+        crossfade: bool = True,
+        metrics: Optional[Metrics] = None,
+        retime: bool = True,
     ):
+        """Create a loop player.
+
+        Args:
+            sound: Sound to start playing with
+            recorder: Recorder receiving every played block
+            block_size: Number of frames per streamed block
+            crossfade: Crossfade between the outgoing and the incoming sound
+            metrics: Metrics receiving the crossfade and playback latencies
+            retime: Move the next beat boundary as soon as a new sound arrives
+        """
         self.__state = PlayerState.STOPPED
         self.__thread = None
-        self.__sound = sound
         self.__recorder = recorder
+        self.__block_size = block_size
+        self.__lock = threading.Lock()
+        self.__beat: Optional[Beat] = None
+        self.__pending: Optional[Beat] = None if sound is None else PCMBeat(sound)
+        self.__position = 0
+        # Position in the current beat at which the next beat starts
+        self.__end = 0
+        self.__retime = retime
+        self.__crossfade = crossfade
         self.__crossfade_percentage = 0.10
-        self.__crossfaded_sound = None
+        self.__crossfade_from: Optional[Beat] = None
+        # Position in the outgoing loop at which the crossfade starts
+        self.__crossfade_offset = 0
+        self.__crossfade_length = 0
+        self.__crossfade_buffer: NDArray[np.float32] = np.zeros(
+            (0, 0), dtype=np.float32
+        )
+        # Last rendered frame, held while a beat is extended
+        self.__last_frame: NDArray[np.float32] = np.zeros(0, dtype=np.float32)
+        self.__metrics = metrics
+        # Times at which the pending beat was set and its BPM was received
+        self.__pending_times: tuple[float, Optional[float]] = (0.0, None)
+        # Time of a switch to a new beat in the current block, and the
+        # receive time of its BPM
+        self.__switch: Optional[tuple[float, Optional[float]]] = None
+        self.underruns = 0
 
     def start(self):
         self.__thread = threading.Thread(name="loop-player", target=self.__start)
         self.__thread.start()
 
-    def __create_crossfaded_sound(self, sound_data: bytes) -> Sound:
-        """Create a crossfaded version of the sound."""
-        sound_length = len(sound_data)
-        crossfade_samples = int(sound_length * self.__crossfade_percentage)
-
-        # Ensure minimum and maximum crossfade lengths
-        min_crossfade = 500  # Minimum 11ms at 44.1kHz
-        max_crossfade = 4000  # Maximum 91ms at 44.1kHz
-        crossfade_samples = max(min_crossfade, min(crossfade_samples, max_crossfade))
+    def __next_beat(self) -> None:
+        """Move to the start of the next beat, switching to a pending sound."""
+        with self.__lock:
+            pending, self.__pending = self.__pending, None
+            ready, timestamp = self.__pending_times
 
-        if sound_length <= crossfade_samples * 2:
-            return Sound(buffer=sound_data)
+        self.__crossfade_from = None
+        if pending is not None:
+            if self.__metrics is not None:
+                now = time.monotonic()
+                self.__metrics.observe("crossfade", now - ready)
+                self.__switch = (now, timestamp)
+            if self.__crossfade and self.__beat is not None:
+                self.__crossfade_from = self.__beat
+                # A trimmed beat continues from where it was cut,
+                # an extended one from the start of its loop
+                self.__crossfade_offset = (
+                    self.__end if self.__end < self.__beat.frames else 0
+                )
+                self.__crossfade_length = self.__get_crossfade_length(
+                    self.__beat, pending
+                )
+            self.__beat = pending
+        self.__position = 0
+        self.__end = 0 if self.__beat is None else self.__beat.frames
 
-        # Convert bytes to samples (assuming 16-bit audio) and create a copy
-        samples = np.frombuffer(sound_data, dtype=np.int16).copy()
+    def __retime_beat(self) -> None:
+        """Move the end of the current beat to one period of a pending sound."""
+        with self.__lock:
+            pending = self.__pending
+        if pending is None or self.__beat is None:
+            return
 
-        # Create fade-in and fade-out curves with smoother transition
-        fade_in = np.sin(np.linspace(0, np.pi / 2, crossfade_samples)) ** 2
-        fade_out = np.sin(np.linspace(np.pi / 2, np.pi, crossfade_samples)) ** 2
-
-        # Apply crossfade
-        samples[:crossfade_samples] = (samples[:crossfade_samples] * fade_in).astype(
-            np.int16
+        # An overdue beat starts right away, but never within a crossfade
+        crossfading = self.__crossfade_from is not None
+        self.__end = max(
+            pending.frames,
+            self.__position,
+            self.__crossfade_length if crossfading else 0,
         )
-        samples[-crossfade_samples:] = (samples[-crossfade_samples:] * fade_out).astype(
-            np.int16
+
+    def __get_crossfade_length(self, outgoing: Beat, incoming: Beat) -> int:
+        """Crossfade length in frames for a transition between two beats."""
+        return crossfade_length(
+            outgoing.frames,
+            incoming.frames,
+            self.__crossfade_percentage,
+            self.min_crossfade,
+            self.max_crossfade,
         )
 
-        # Convert back to bytes
-        crossfade_buffer = samples.tobytes()
-        return Sound(buffer=crossfade_buffer)
+    def __crossfade_segment(self, start: int, out: NDArray[np.float32]) -> None:
+        """Mix the outgoing loop into a segment at the start of the incoming beat.
+
+        Args:
+            start: Position of the segment in the incoming beat
+            out: Rendered frames of the incoming beat
+        """
+        outgoing = self.__crossfade_from
+        end = min(start + len(out), self.__crossfade_length)
+        if outgoing is None or start >= end:
+            return
+
+        count = end - start
+        fade_in, fade_out = crossfade_curves(self.__crossfade_length)
+        tail = self.__crossfade_buffer[:count]
+
+        # The outgoing loop wraps around at its end
+        filled = 0
+        while filled < count:
+            position = (self.__crossfade_offset + start + filled) % outgoing.frames
+            length = min(count - filled, outgoing.frames - position)
+            outgoing.render(position, tail[filled : filled + length])
+            filled += length
+
+        segment = out[:count]
+        segment *= fade_in[start:end]
+        tail *= fade_out[start:end]
+        segment += tail
+
+    def render(self, out: NDArray[np.float32]) -> None:
+        """
+        Fill a block with the next frames of the beat loop, called by the
+        playback thread for every streamed block
+        """
+        if self.__crossfade_buffer.shape[0] < len(out) or (
+            self.__crossfade_buffer.shape[1:] != out.shape[1:]
+        ):
+            self.__crossfade_buffer = np.zeros_like(out)
+            self.__last_frame = np.zeros(out.shape[1:], dtype=np.float32)
+
+        if self.__retime:
+            self.__retime_beat()
+
+        filled = 0
+        while filled < len(out):
+            if self.__beat is None or self.__position >= self.__end:
+                self.__next_beat()
+
+            beat = self.__beat
+            if beat is None:
+                out[filled:] = 0
+                return
+
+            count = min(len(out) - filled, self.__end - self.__position)
+            segment = out[filled : filled + count]
+            # An extended beat holds its last frame, the silence level of
+            # a beat is not necessarily zero
+            audible = max(0, min(count, beat.frames - self.__position))
+            if audible > 0:
+                beat.render(self.__position, segment[:audible])
+                self.__last_frame[...] = segment[audible - 1]
+            segment[audible:] = self.__last_frame
+            self.__crossfade_segment(self.__position, segment)
+            self.__position += count
+            filled += count
 
     def __start(self):
         self.__state = PlayerState.PLAYING
 
-        # Pre-create the crossfaded sound
-        if self.__sound is not None:
-            self.__crossfaded_sound = self.__create_crossfaded_sound(
-                self.__sound.get_raw()
-            )
+        channel_param = ChannelParam()
+        dtype = channel_param.dtype
+        limits = np.iinfo(dtype)
+
+        # Reserve the first channel so that other sounds never take it over
+        set_reserved(1)
+        channel = Channel(0)
+
+        mix = np.zeros((self.__block_size, channel_param.count), dtype=np.float32)
+        block = np.zeros((self.__block_size, channel_param.count), dtype=dtype)
+
+        # Poll the channel a few times per block so the queue never runs dry
+        poll_interval = self.__block_size / channel_param.framerate / 4
+        next_poll = time.monotonic()
+        streaming = False
+        # Switch to a new beat in a queued block that has not started playing
+        queued_switch: Optional[tuple[float, Optional[float]]] = None
 
         while self.__state == PlayerState.PLAYING:
-            if self.__sound is None:
-                wait(100)
-                continue
+            if queued_switch is not None and queue_empty(channel):
+                self.__observe_play(*queued_switch)
+                queued_switch = None
 
-            start_time = datetime.now()
+            if self.__beat is not None or self.__pending is not None:
+                while not channel.get_busy() or queue_empty(channel):
+                    self.render(mix)
+                    np.rint(mix, out=mix)
+                    np.clip(mix, limits.min, limits.max, out=mix)
+                    block[:] = mix
+                    if self.__recorder is not None:
+                        self.__recorder.record(block)
 
-            # Play the pre-created crossfaded sound
-            if self.__crossfaded_sound is not None:
-                self.__crossfaded_sound.play()
+                    if channel.get_busy():
+                        channel.queue(Sound(buffer=block))
+                    else:
+                        # The channel ran dry after it had already been streaming
+                        if streaming:
+                            self.underruns += 1
+                        streaming = True
+                        channel.play(Sound(buffer=block))
 
-            if self.__recorder is not None:
-                self.__recorder.record(self.__sound)
+                    if self.__switch is not None:
+                        if queue_empty(channel):
+                            self.__observe_play(*self.__switch)
+                        else:
+                            queued_switch = self.__switch
+                        self.__switch = None
 
-            end_time = datetime.now()
-            processing_time = (end_time - start_time).microseconds // 1000
-            wait_time = int(self.__sound.get_length() * 1000) - processing_time
-            wait(wait_time)
+            next_poll += poll_interval
+            delay = next_poll - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_poll = time.monotonic()
 
+        channel.stop()
         self.__state = PlayerState.STOPPED
 
+    def __observe_play(self, switched: float, timestamp: Optional[float]) -> None:
+        """Record the latencies of a new beat that has started playing."""
+        assert self.__metrics is not None
+        now = time.monotonic()
+        self.__metrics.observe("play", now - switched)
+        if timestamp is not None:
+            self.__metrics.observe("end_to_end", now - timestamp)
+
     def stop(self):
         self.__state = PlayerState.STOPPING
         if self.__thread is not None:
             self.__thread.join()
 
     def set_sound(self, sound: Sound):
-        self.__sound = sound
-        # Recreate the crossfaded sound when setting a new sound
-        self.__crossfaded_sound = self.__create_crossfaded_sound(sound.get_raw())
+        self.set_beat(PCMBeat(sound))
+
+    def set_beat(self, beat: Beat, timestamp: Optional[float] = None):
+        """
+        Switch to a beat at the next beat boundary
+
+        Args:
+            beat: Beat to switch to
+            timestamp: Monotonic time at which the BPM of the beat was received
+        """
+        ready = 0.0 if self.__metrics is None else time.monotonic()
+        with self.__lock:
+            self.__pending = beat
+            self.__pending_times = (ready, timestamp)
@@ -1,12 +1,19 @@
+from functools import lru_cache
+from typing import Optional
+
 import numpy as np
 from numpy.typing import NDArray
-from scipy import signal  # pyright: ignore[reportMissingTypeStubs]
 
 from app.sound.adapter import ChannelAdapter
+from app.sound.expression import Operand, Sum, Wave, expression
+from app.sound.filters import butter_sos, lfilter, sosfilt, sosfiltfilt
 
 LUB_SOUND_AMPLITUDE = 1.00
 DUB_SOUND_AMPLITUDE = 0.95
 
+BROWN_NOISE_DECAY = 0.98
+BROWN_NOISE_GAIN = 0.1
+
 
 class HeartbeatSound(ChannelAdapter):
     """
@@ -57,18 +64,13 @@ class HeartbeatSound(ChannelAdapter):
 
 
 class CompositeSound(ChannelAdapter):
-    def __init__(self, sounds: list[ChannelAdapter]) -> None:
-        # Find the longest sound in the list
-        max_duration = max([sound.get_length() for sound in sounds])
+    """
+    Mix of sounds, shorter sounds are mixed into the start of the longest one
+    """
 
-        # Generate a composite sound by mixing all sounds
-        composite_wave = np.zeros(
-            round(max_duration * self.channel_param.framerate), dtype=np.float32
-        )
-        for sound in sounds:
-            sound_wave = sound.wave
-            sound_wave = sound_wave[: len(composite_wave)]
-            composite_wave += sound_wave
+    def __init__(self, sounds: list[Operand]) -> None:
+        # Mix all sounds into a single buffer of the longest sound's length
+        composite_wave = Sum([expression(sound) for sound in sounds]).evaluate()
 
         super().__init__(composite_wave)
 
@@ -91,6 +93,23 @@ class GaussianPulse(ChannelAdapter):
         super().__init__(pulse)
 
 
+@lru_cache(maxsize=128)
+def gaussian_pulse_template(length: int, sigma: float) -> NDArray[np.float32]:
+    """Gaussian pulse scaled to a peak of 1.0, shared between sounds of equal width.
+
+    Args:
+        length: Length of the pulse in samples
+        sigma: Standard deviation of the Gaussian
+    """
+    x = np.linspace(-length // 2, length // 2, length, dtype=np.float32)
+    pulse = np.exp(-(x**2) / (2 * sigma**2))
+    # Same scaling as the wave of a GaussianPulse, without creating a sound
+    template = ChannelAdapter.normalize_range(pulse, -1.0, 1.0)
+    template /= np.max(template)
+    template.setflags(write=False)
+    return template
+
+
 class DeepBrownNoise(ChannelAdapter):
     """
     Generates deep brown noise with emphasis on low frequencies
@@ -101,29 +120,42 @@ class DeepBrownNoise(ChannelAdapter):
 
         Args:
             length: Length of the noise in samples
-            sample_rate: Sample rate in Hz
         """
+        super().__init__(self.noise(length))
+
+    @classmethod
+    def noise(cls, length: int, framerate: Optional[int] = None) -> NDArray[np.float32]:
+        """Generate deep brown noise scaled to a peak of 1.0.
+
+        Args:
+            length: Length of the noise in samples
+            framerate: Framerate of the noise, the mixer framerate by default
+        """
+        if framerate is None:
+            framerate = cls.channel_param.framerate
+
         # White noise
         white_noise: NDArray[np.float32] = np.random.normal(0, 1, length).astype(
             np.float32
         )
 
-        # Create brown noise by integrating white noise with stronger coefficient
-        brown: NDArray[np.float32] = np.zeros_like(white_noise)
-        brown[0] = white_noise[0]
-        for i in range(1, length):
-            # Higher coefficient (0.98) gives more emphasis to low frequencies
-            brown[i] = 0.98 * brown[i - 1] + white_noise[i] * 0.1
+        # Create brown noise by integrating white noise with stronger coefficient,
+        # brown[i] = 0.98 * brown[i - 1] + 0.1 * white_noise[i] as a one-pole IIR
+        # filter. Higher coefficient (0.98) gives more emphasis to low frequencies.
+        # The initial state makes the first sample equal to white_noise[0].
+        brown: NDArray[np.float32] = lfilter(
+            [BROWN_NOISE_GAIN],
+            [1.0, -BROWN_NOISE_DECAY],
+            white_noise,
+            zi=[(1.0 - BROWN_NOISE_GAIN) * white_noise[0]],
+        )[0]
 
         # Apply a low-pass filter to further emphasize bass
-        b, a = signal.butter(  # pyright: ignore
-            3, 150.0 / (self.channel_param.framerate / 2), btype="low"
-        )  # pyright: ignore
-        filtered_brown: NDArray[np.float32] = signal.filtfilt(b, a, brown)  # pyright: ignore
+        sos = butter_sos("low", 3, 150.0, framerate)
+        filtered_brown = sosfiltfilt(sos, brown)
 
         # Normalize
-        filtered_brown = filtered_brown / np.max(np.abs(filtered_brown))  # pyright: ignore
-        super().__init__(filtered_brown)  # pyright: ignore
+        return filtered_brown / np.max(np.abs(filtered_brown))  # pyright: ignore
 
 
 class HeartbeatSoundComponent(ChannelAdapter):
@@ -137,65 +169,99 @@ class HeartbeatSoundComponent(ChannelAdapter):
         """
         self.beat_period = 60.0 / bpm
         self.sample_count = round(self.beat_period * self.channel_param.framerate)
-        super().__init__(np.zeros(self.sample_count, dtype=np.float32))
+        super().__init__(self.envelope(bpm))
+
+    @classmethod
+    def envelope(cls, bpm: int, framerate: Optional[int] = None) -> NDArray[np.float32]:
+        """Envelope of the component over one beat period.
+
+        Args:
+            bpm: Beats per minute
+            framerate: Framerate of the envelope, the mixer framerate by default
+        """
+        if framerate is None:
+            framerate = cls.channel_param.framerate
+        sample_count = round(60.0 / bpm * framerate)
+        return np.zeros(sample_count, dtype=np.float32)
+
+    @staticmethod
+    def place_pulse(
+        wave: NDArray[np.float32], pulse: NDArray[np.float32], position: int
+    ) -> None:
+        """Place a pulse centered on a position, wrapping around the beat period.
+
+        Overlapping samples keep the larger of the existing and the pulse value.
+
+        Args:
+            wave: Envelope of one beat period
+            pulse: Pulse waveform
+            position: Position of the pulse center in samples
+        """
+        start = position - len(pulse) // 2
+        indices = np.arange(start, start + len(pulse)) % len(wave)
+        if len(pulse) <= len(wave):
+            # Indices are unique, a gather and scatter avoids the slow ufunc.at
+            wave[indices] = np.maximum(wave[indices], pulse)
+        else:
+            np.maximum.at(wave, indices, pulse)
 
 
 class LubSound(HeartbeatSoundComponent):
     """Generates the 'lub' sound component."""
 
-    def __init__(self, bpm: int) -> None:
-        """Create the lub sound.
+    @classmethod
+    def envelope(cls, bpm: int, framerate: Optional[int] = None) -> NDArray[np.float32]:
+        """Create the lub sound envelope.
 
         Args:
             bpm: Beats per minute
+            framerate: Framerate of the envelope, the mixer framerate by default
         """
-        super().__init__(bpm)
+        wave = super().envelope(bpm, framerate)
+        sample_count = len(wave)
 
         # Generate the lub sound (S1) - sharper and louder
-        lub_width = int(0.07 * self.sample_count)
-        lub_pulse = GaussianPulse(2 * lub_width, sigma=lub_width / 3)
-        lub_peak = LUB_SOUND_AMPLITUDE * lub_pulse.wave / np.max(lub_pulse.wave)
+        lub_width = int(0.07 * sample_count)
+        lub_pulse = gaussian_pulse_template(2 * lub_width, sigma=lub_width / 3)
+        lub_peak = LUB_SOUND_AMPLITUDE * lub_pulse
 
         # Position the sound in the beat period
-        lub_pos = int(0.2 * self.sample_count)
+        lub_pos = int(0.2 * sample_count)
 
         # Add lub sound to the waveform
-        for i in range(len(lub_peak)):
-            pos = (lub_pos - lub_width + i) % self.sample_count
-            self.wave[pos] = max(self.wave[pos], lub_peak[i])
+        cls.place_pulse(wave, lub_peak, lub_pos)
 
         # Apply envelope shaping
-        self.wave = self.wave**2  # Square for more pronounced curve
+        return wave**2  # Square for more pronounced curve
 
 
 class DubSound(HeartbeatSoundComponent):
     """Generates the 'dub' sound component."""
 
-    def __init__(self, bpm: int) -> None:
-        """Create the dub sound.
+    @classmethod
+    def envelope(cls, bpm: int, framerate: Optional[int] = None) -> NDArray[np.float32]:
+        """Create the dub sound envelope.
 
         Args:
             bpm: Beats per minute
+            framerate: Framerate of the envelope, the mixer framerate by default
         """
-        super().__init__(bpm)
+        wave = super().envelope(bpm, framerate)
+        sample_count = len(wave)
 
         # Generate the dub sound (S2) - softer and shorter
-        dub_width = int(0.05 * self.sample_count)
-        dub_pulse = GaussianPulse(2 * dub_width, sigma=dub_width / 3)
-        dub_peak = (
-            DUB_SOUND_AMPLITUDE * dub_pulse.wave / np.max(dub_pulse.wave)
-        )  # Smaller than S1
+        dub_width = int(0.05 * sample_count)
+        dub_pulse = gaussian_pulse_template(2 * dub_width, sigma=dub_width / 3)
+        dub_peak = DUB_SOUND_AMPLITUDE * dub_pulse  # Smaller than S1
 
         # Position the sound in the beat period
-        dub_pos = int(0.55 * self.sample_count)
+        dub_pos = int(0.55 * sample_count)
 
         # Add dub sound to the waveform
-        for i in range(len(dub_peak)):
-            pos = (dub_pos - dub_width + i) % self.sample_count
-            self.wave[pos] = max(self.wave[pos], dub_peak[i])
+        cls.place_pulse(wave, dub_peak, dub_pos)
 
         # Apply envelope shaping
-        self.wave = self.wave**2  # Square for more pronounced curve
+        return wave**2  # Square for more pronounced curve
 
 
 class RealisticHeartbeatSound(ChannelAdapter):
@@ -205,29 +271,90 @@ class RealisticHeartbeatSound(ChannelAdapter):
     """
 
     def __init__(self, bpm: int) -> None:
+        super().__init__(self.synthesize(bpm, self.channel_param.framerate))
+
+    @classmethod
+    def synthesize(cls, bpm: int, framerate: int) -> NDArray[np.float32]:
+        """Synthesize the soundwave of a single beat, without creating a sound.
+
+        Args:
+            bpm: Beats per minute
+            framerate: Framerate of the soundwave
+        """
         # Calculate the beat period and sample count
         beat_period = 60.0 / bpm
-        sample_count = round(beat_period * self.channel_param.framerate)
-
-        # Generate the main sound components
-        lub_sound = LubSound(bpm)
-        dub_sound = DubSound(bpm)
-        brown_noise = DeepBrownNoise(sample_count)
+        sample_count = round(beat_period * framerate)
+
+        # Generate the main sound components as plain waves,
+        # only the final sound is converted to PCM
+        lub_sound = Wave(LubSound.envelope(bpm, framerate))
+        dub_sound = Wave(DubSound.envelope(bpm, framerate))
+        brown_noise = Wave(
+            cls.normalize_range(
+                DeepBrownNoise.noise(sample_count, framerate), -1.0, 1.0
+            )
+        )
 
         # Combine the sounds
-        combined_sound = lub_sound.wave + dub_sound.wave
-        combined_sound = combined_sound * brown_noise.wave
+        combined_sound = ((lub_sound + dub_sound) * brown_noise).evaluate()
 
         # Normalize the sound
         combined_sound = combined_sound / np.max(np.abs(combined_sound))
 
         # Apply high-pass filter with a cutoff frequency of 500 Hz and 6db roll-off
-        b, a = signal.butter(  # pyright: ignore
-            1, 50.0 / (self.channel_param.framerate / 2), btype="high"
+        sos = butter_sos("high", 1, 50.0, framerate)
+        return sosfiltfilt(sos, combined_sound)  # pyright: ignore
+
+
+@lru_cache(maxsize=16)
+def heartbeat_envelope(bpm: int, framerate: int) -> NDArray[np.float32]:
+    """Lub-dub envelope of a single beat period, without the noise.
+
+    Args:
+        bpm: Beats per minute
+        framerate: Framerate the envelope is rendered at
+    """
+    envelope = LubSound.envelope(bpm, framerate) + DubSound.envelope(bpm, framerate)
+    envelope.setflags(write=False)
+    return envelope
+
+
+@lru_cache(maxsize=4)
+def canonical_heartbeat_wave(bpm: int, framerate: int) -> NDArray[np.float32]:
+    """
+    Single heartbeat rendered with the full synthesis pipeline at a framerate
+    """
+    wave = RealisticHeartbeatSound.synthesize(bpm, framerate).astype(np.float32)
+    wave.setflags(write=False)
+    return wave
+
+
+class StretchedHeartbeatSound(ChannelAdapter):
+    """
+    Heartbeat derived from a canonical RealisticHeartbeatSound by resampling
+
+    The canonical beat is rendered once, every other BPM is a linear time-stretch
+    of it. The lub and dub sounds are placed as fractions of the beat period,
+    so stretching keeps them where RealisticHeartbeatSound would put them.
+    The noise texture is stretched along with the beat, shifting its pitch
+    for BPMs far from the canonical one.
+    """
+
+    CANONICAL_BPM: int = 60
+
+    def __init__(self, bpm: int) -> None:
+        canonical = canonical_heartbeat_wave(
+            self.CANONICAL_BPM, self.channel_param.framerate
+        )
+        sample_count = round(60.0 / bpm * self.channel_param.framerate)
+
+        # Sample the canonical beat at evenly spaced fractional positions
+        positions = np.arange(sample_count, dtype=np.float32) * (
+            len(canonical) / sample_count
         )
-        combined_sound = signal.filtfilt(b, a, combined_sound)  # pyright: ignore
+        stretched = np.interp(positions, np.arange(len(canonical)), canonical)
 
-        super().__init__(combined_sound)  # pyright: ignore
+        super().__init__(stretched.astype(np.float32))
 
 
 class BrownNoise(ChannelAdapter):
@@ -240,36 +367,30 @@ class BrownNoise(ChannelAdapter):
             round(duration * self.channel_param.framerate)
         ).astype(np.float32)
 
-        low_pass_filters: list[tuple[NDArray[np.float32], NDArray[np.float32]]] = []
         filter_order = 4
-
         frequency_bands_hz = [5, 10, 20, 40, 80, 160, 250]
-        frequency_amplitudes = [0.0625, 0.125, 0.25, 0.125, 0.0625, 0.03125, 0.03125]
-
-        for freq in frequency_bands_hz:
-            b, a = signal.butter(  # pyright: ignore
-                filter_order, freq / (self.channel_param.framerate / 2), btype="low"
-            )  # pyright: ignore
-            low_pass_filters.append((b, a))  # pyright: ignore
-
-        for i, (b, a) in enumerate(low_pass_filters):
-            b = b * frequency_amplitudes[i]
-            a = a * frequency_amplitudes[i]
-            low_pass_filters[i] = (b, a)
-
-        # Generate multiple layers of brown noise with different frequencies
-        brown_noise_layers: list[NDArray[np.float32]] = []
-        for b, a in low_pass_filters:
-            filtered_noise: NDArray[np.float32] = np.convolve(  # pyright: ignore
-                white_noise,
-                np.ones(filter_order) / filter_order,
-                mode="same",  # pyright: ignore
-            )
-            filtered_noise = signal.lfilter(b, a, filtered_noise)  # pyright: ignore
-            brown_noise_layers.append(filtered_noise)
+
+        # The band amplitudes used to scale both the numerator and the
+        # denominator of each filter, so they cancelled out and every band
+        # was mixed at unit gain. The bands are still mixed at unit gain.
+
+        # Smooth the white noise once, it is the input of every band
+        smoothed_noise: NDArray[np.float64] = np.convolve(  # pyright: ignore
+            white_noise,
+            np.ones(filter_order) / filter_order,
+            mode="same",  # pyright: ignore
+        )
+
+        # Generate a layer of brown noise per frequency band
+        brown_noise_layers = np.empty(
+            (len(frequency_bands_hz), len(white_noise)), dtype=np.float64
+        )
+        for layer, freq in zip(brown_noise_layers, frequency_bands_hz):
+            sos = butter_sos("low", filter_order, freq, self.channel_param.framerate)
+            layer[:] = sosfilt(sos, smoothed_noise)
 
         # Combine the layers
-        brown_noise = np.sum(np.vstack(brown_noise_layers), axis=0)
+        brown_noise = brown_noise_layers.sum(axis=0)
 
         super().__init__(brown_noise)
 
@@ -303,10 +424,8 @@ class LowPassFilter(ChannelAdapter):
         )
         y_axis = np.sin(2 * np.pi * x_axis * frequency)
 
-        b, a = signal.butter(  # pyright: ignore
-            2, frequency / (self.channel_param.framerate / 2), btype="low"
-        )
-        low_pass_filtered: NDArray[np.float32] = signal.lfilter(b, a, y_axis)  # pyright: ignore
+        sos = butter_sos("low", 2, frequency, self.channel_param.framerate)
+        low_pass_filtered = sosfilt(sos, y_axis)
 
         super().__init__(low_pass_filtered)
 
@@ -0,0 +1,120 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Generic, Optional, TypeVar
+
+from app.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Sequence number, BPM, receive time of the BPM and time of the request
+Request = tuple[int, float, Optional[float], float]
+
+
+class RenderScheduler(Generic[T]):
+    """
+    Renders sounds for BPM requests on a thread pool
+
+    Requests are coalesced: while every worker is busy only the latest
+    requested BPM is kept, older pending requests are dropped. A finished
+    sound is handed over only if no newer request has already been delivered,
+    so a slow render can never replace a more recent one.
+    """
+
+    def __init__(
+        self,
+        render: Callable[[float], T],
+        on_ready: Callable[[T, Optional[float]], None],
+        max_workers: int = 2,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        """Create a render scheduler.
+
+        Args:
+            render: Renders the sound of a BPM value
+            on_ready: Receives finished sounds with the receive time of their
+                BPM, called from a worker thread
+            max_workers: Number of renders allowed to run concurrently
+            metrics: Metrics receiving the render latency
+        """
+        if max_workers < 1:
+            raise ValueError("At least one render worker is required")
+
+        self.__render = render
+        self.__on_ready = on_ready
+        self.__max_workers = max_workers
+        self.__metrics = metrics
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="render"
+        )
+        self.__lock = Lock()
+        self.__sequence = 0
+        self.__delivered = 0
+        self.__in_flight = 0
+        self.__pending: Request | None = None
+
+        self.rendered = 0
+        self.dropped = 0
+
+    def submit(self, bpm: float, timestamp: Optional[float] = None) -> None:
+        """
+        Request a sound for the BPM, returns without waiting for the render
+
+        Args:
+            bpm: Requested BPM
+            timestamp: Monotonic time at which the BPM was received
+        """
+        requested = 0.0 if self.__metrics is None else time.monotonic()
+        with self.__lock:
+            self.__sequence += 1
+            request = (self.__sequence, bpm, timestamp, requested)
+            if self.__in_flight >= self.__max_workers:
+                if self.__pending is not None:
+                    self.dropped += 1
+                self.__pending = request
+                return
+            self.__in_flight += 1
+
+        self.__executor.submit(self.__run, request)
+
+    def stop(self) -> None:
+        """
+        Stop the workers, pending requests are discarded
+        """
+        with self.__lock:
+            self.__pending = None
+        self.__executor.shutdown(wait=True, cancel_futures=True)
+
+    def __run(self, request: Request) -> None:
+        sequence, bpm, timestamp, requested = request
+        while True:
+            try:
+                sound = self.__render(bpm)
+            except Exception:
+                logger.exception(f"Failed to render sound for {bpm} BPM")
+            else:
+                if self.__metrics is not None:
+                    self.__metrics.observe("render", time.monotonic() - requested)
+                self.__deliver(sequence, sound, timestamp)
+
+            with self.__lock:
+                if self.__pending is None:
+                    self.__in_flight -= 1
+                    return
+                (sequence, bpm, timestamp, requested), self.__pending = (
+                    self.__pending,
+                    None,
+                )
+
+    def __deliver(self, sequence: int, sound: T, timestamp: Optional[float]) -> None:
+        with self.__lock:
+            if sequence < self.__delivered:
+                self.dropped += 1
+                return
+            self.__delivered = sequence
+            self.rendered += 1
+            # Hand over while holding the lock so deliveries stay ordered
+            self.__on_ready(sound, timestamp)
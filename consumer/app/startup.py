@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Generator
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    """
+    Durations of the startup steps, from the start of the application to the
+    first beat handed to the player
+
+    Steps are timed with the performance counter. Time spent by the interpreter
+    before the profile is created is not included.
+    """
+
+    def __init__(self) -> None:
+        self.__start = time.perf_counter()
+        self.__lock = threading.Lock()
+        self.__steps: list[tuple[str, float]] = []
+        self.__marks: list[tuple[str, float]] = []
+
+    @contextmanager
+    def step(self, name: str) -> Generator[None, None, None]:
+        """
+        Time the enclosed block as a startup step
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.__steps.append((name, time.perf_counter() - start))
+
+    def mark(self, name: str) -> None:
+        """
+        Record the time elapsed since the start of the application
+        """
+        with self.__lock:
+            self.__marks.append((name, time.perf_counter() - self.__start))
+
+    def report(self) -> str:
+        with self.__lock:
+            steps = list(self.__steps)
+            marks = list(self.__marks)
+
+        width = max((len(name) for name, _ in steps + marks), default=0)
+        lines = ["Startup profile:"]
+        lines.extend(
+            f"  {name:<{width}} {seconds * 1000:8.1f} ms" for name, seconds in steps
+        )
+        lines.extend(
+            f"  {name:<{width}} {seconds * 1000:8.1f} ms since start"
+            for name, seconds in marks
+        )
+        return "\n".join(lines)
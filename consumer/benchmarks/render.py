@@ -0,0 +1,106 @@
+"""
+Render time of RealisticHeartbeatSound per BPM
+
+Compares the current DeepBrownNoise implementation with the original
+per-sample integration loop. Run from the consumer directory:
+
+    SDL_AUDIODRIVER=dummy python -m benchmarks.render
+"""
+
+import argparse
+import time
+from contextlib import contextmanager
+from typing import Callable, Generator, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy import signal  # pyright: ignore[reportMissingTypeStubs]
+
+from app.sound import presets
+
+
+class LoopDeepBrownNoise(presets.DeepBrownNoise):
+    """
+    DeepBrownNoise integrating white noise with a per-sample Python loop
+    """
+
+    @classmethod
+    def noise(cls, length: int, framerate: Optional[int] = None) -> NDArray[np.float32]:
+        if framerate is None:
+            framerate = cls.channel_param.framerate
+        white_noise: NDArray[np.float32] = np.random.normal(0, 1, length).astype(
+            np.float32
+        )
+
+        brown: NDArray[np.float32] = np.zeros_like(white_noise)
+        brown[0] = white_noise[0]
+        for i in range(1, length):
+            brown[i] = 0.98 * brown[i - 1] + white_noise[i] * 0.1
+
+        b, a = signal.butter(  # pyright: ignore
+            3, 150.0 / (framerate / 2), btype="low"
+        )
+        filtered_brown: NDArray[np.float32] = signal.filtfilt(b, a, brown)  # pyright: ignore
+
+        return filtered_brown / np.max(np.abs(filtered_brown))  # pyright: ignore
+
+
+@contextmanager
+def deep_brown_noise(
+    implementation: type[presets.DeepBrownNoise],
+) -> Generator[None, None, None]:
+    """
+    Temporarily replace the DeepBrownNoise used by the presets
+    """
+    original = presets.DeepBrownNoise
+    presets.DeepBrownNoise = implementation  # pyright: ignore
+    try:
+        yield
+    finally:
+        presets.DeepBrownNoise = original
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    """
+    Best wall-clock time of the given function in seconds
+    """
+    timings: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(description=__doc__)
+    args_parser.add_argument(
+        "--bpm",
+        help="BPM values to render",
+        type=int,
+        nargs="+",
+        default=[40, 60, 80, 100, 120, 160, 200],
+    )
+    args_parser.add_argument(
+        "--repeat",
+        help="Number of renders per BPM, the best one is reported",
+        type=int,
+        default=5,
+    )
+    args = args_parser.parse_args()
+
+    print(f"{'BPM':>5} {'loop (ms)':>10} {'vectorized (ms)':>16} {'speedup':>8}")
+    for bpm in args.bpm:
+        with deep_brown_noise(LoopDeepBrownNoise):
+            before = best_of(
+                lambda: presets.RealisticHeartbeatSound(bpm=bpm), args.repeat
+            )
+        after = best_of(lambda: presets.RealisticHeartbeatSound(bpm=bpm), args.repeat)
+        print(
+            f"{bpm:>5} {before * 1000:>10.2f} {after * 1000:>16.2f}"
+            f" {before / after:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
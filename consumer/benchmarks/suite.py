@@ -0,0 +1,260 @@
+"""
+Benchmark suite for synthesis, PCM conversion and playback timing
+
+Results are written as JSON so that runs on different machines and commits
+can be compared. Run from the consumer directory:
+
+    SDL_AUDIODRIVER=dummy python -m benchmarks.suite --output results.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.sound.adapter import ChannelAdapter, ChannelParam
+from app.sound.beat import PCMBeat
+from app.sound.player import LoopPlayer
+from app.sound.presets import RealisticHeartbeatSound
+
+Result = dict[str, Any]
+
+
+def timings(fn: Callable[[], object], repeat: int) -> list[float]:
+    """
+    Wall-clock times of the given function in seconds
+    """
+    result: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        result.append(time.perf_counter() - start)
+    return result
+
+
+def summary_ms(samples: list[float]) -> Result:
+    """
+    Summary of timings in milliseconds
+    """
+    return {
+        "min_ms": min(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def bench_render(bpms: list[int], repeat: int) -> list[Result]:
+    """
+    Render time of RealisticHeartbeatSound per BPM
+    """
+    return [
+        {
+            "bpm": bpm,
+            **summary_ms(timings(lambda: RealisticHeartbeatSound(bpm), repeat)),
+        }
+        for bpm in bpms
+    ]
+
+
+def bench_adapter(duration: float, repeat: int) -> Result:
+    """
+    ChannelAdapter construction throughput and peak traced memory
+    """
+    channel_param = ChannelParam()
+    wave = np.random.default_rng().uniform(
+        -1, 1, round(duration * channel_param.framerate)
+    )
+    wave = wave.astype(np.float32)
+
+    samples = timings(lambda: ChannelAdapter(wave), repeat)
+
+    tracemalloc.start()
+    ChannelAdapter(wave)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(samples)
+    return {
+        "samples": len(wave),
+        **summary_ms(samples),
+        "samples_per_second": len(wave) / best,
+        "peak_traced_bytes": peak,
+    }
+
+
+def bench_crossfade(bpms: tuple[int, int], repeat: int, block_size: int) -> Result:
+    """
+    Render time of a loop player block starting a crossfaded beat, compared
+    with a block in the middle of a beat
+    """
+    channel_param = ChannelParam()
+    outgoing, incoming = (PCMBeat(RealisticHeartbeatSound(bpm)) for bpm in bpms)
+    whole_beat: NDArray[np.float32] = np.zeros(
+        (outgoing.frames, channel_param.count), dtype=np.float32
+    )
+    mix: NDArray[np.float32] = np.zeros(
+        (block_size, channel_param.count), dtype=np.float32
+    )
+
+    steady: list[float] = []
+    crossfade: list[float] = []
+    for _ in range(repeat):
+        # Play the outgoing beat up to its end, so the next block switches
+        # to the incoming beat
+        player = LoopPlayer(block_size=block_size, crossfade=True)
+        player.set_beat(outgoing)
+        player.render(whole_beat)
+        player.set_beat(incoming)
+        crossfade.extend(timings(lambda: player.render(mix), 1))
+
+        # Move past the longest possible crossfade
+        player.render(whole_beat[: LoopPlayer.max_crossfade])
+        steady.extend(timings(lambda: player.render(mix), 1))
+
+    return {
+        "block_size": block_size,
+        "steady": summary_ms(steady),
+        "crossfade": summary_ms(crossfade),
+    }
+
+
+class TimedBeat(PCMBeat):
+    """
+    Beat recording the wall-clock time every time its onset is rendered
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.onsets: list[float] = []
+
+    def render(self, start: int, out: NDArray[np.float32]) -> None:
+        if start == 0:
+            self.onsets.append(time.monotonic())
+        super().render(start, out)
+
+
+def bench_playback(bpm: int, duration: float, block_size: int) -> Result:
+    """
+    Beat onset jitter and drift of the playback loop
+
+    The onsets are timed when the player renders them. A line fitted through
+    the onset times gives the actual beat period, its deviation from the
+    nominal period is the drift, and the residuals are the jitter.
+    """
+    channel_param = ChannelParam()
+    beat = TimedBeat(RealisticHeartbeatSound(bpm))
+    player = LoopPlayer(block_size=block_size, crossfade=False)
+    player.set_beat(beat)
+    player.start()
+    try:
+        time.sleep(duration)
+    finally:
+        player.stop()
+
+    onsets: NDArray[np.float64] = np.array(beat.onsets)
+    nominal = beat.frames / channel_param.framerate
+    result: Result = {
+        "bpm": bpm,
+        "duration_s": duration,
+        "block_size": block_size,
+        "beats": len(onsets),
+        "underruns": player.underruns,
+        "nominal_period_ms": nominal * 1000,
+    }
+    if len(onsets) < 3:
+        return result
+
+    index = np.arange(len(onsets))
+    slope, intercept = np.polyfit(index, onsets, 1)
+    residuals: NDArray[np.float64] = onsets - (slope * index + intercept)
+    intervals = np.diff(onsets)
+    result.update(
+        {
+            "period_ms": slope * 1000,
+            "drift_ppm": (slope - nominal) / nominal * 1e6,
+            "jitter_rms_ms": float(np.sqrt(np.mean(residuals**2))) * 1000,
+            "jitter_max_ms": float(np.max(np.abs(residuals))) * 1000,
+            "interval_min_ms": float(np.min(intervals)) * 1000,
+            "interval_max_ms": float(np.max(intervals)) * 1000,
+        }
+    )
+    return result
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    args_parser.add_argument(
+        "--output",
+        help="File to write the JSON results to, standard output by default",
+    )
+    args_parser.add_argument(
+        "--bpm",
+        help="BPM values to render",
+        type=int,
+        nargs="+",
+        default=[40, 60, 80, 100, 120, 160, 200],
+    )
+    args_parser.add_argument(
+        "--repeat",
+        help="Number of runs per measurement",
+        type=int,
+        default=10,
+    )
+    args_parser.add_argument(
+        "--block-size",
+        help="Block size of the loop player in frames",
+        type=int,
+        default=1024,
+    )
+    args_parser.add_argument(
+        "--playback-bpm",
+        help="BPM of the beat played in the playback timing benchmark",
+        type=int,
+        default=60,
+    )
+    args_parser.add_argument(
+        "--playback-duration",
+        help="Duration of the playback timing benchmark in seconds",
+        type=float,
+        default=180.0,
+    )
+    args = args_parser.parse_args()
+
+    channel_param = ChannelParam()
+    results: Result = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "framerate": channel_param.framerate,
+            "bit_depth": channel_param.bit_depth,
+            "channels": channel_param.count,
+        },
+        "render": bench_render(args.bpm, args.repeat),
+        "adapter": bench_adapter(1.0, args.repeat),
+        "crossfade": bench_crossfade((60, 90), args.repeat, args.block_size),
+        "playback": bench_playback(
+            args.playback_bpm, args.playback_duration, args.block_size
+        ),
+    }
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import itertools
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Generator, NamedTuple, Optional
+
+from pika.exceptions import AMQPConnectionError, ChannelClosedByBroker
+
+
+class Message(NamedTuple):
+    """
+    A message waiting in a queue of the stand-in broker
+    """
+
+    body: bytes
+    app_id: Optional[str]
+    redelivered: bool = False
+
+
+class FakeBroker:
+    """
+    An in-process stand-in for an AMQP broker
+
+    Implements the part of the blocking pika API used by the AMQP plugin:
+    queues, fanout exchanges, prefetch, acknowledgements and redelivery of
+    unacknowledged messages when a connection is closed.
+    """
+
+    def __init__(self) -> None:
+        self.queues: dict[str, deque[Message]] = {}
+        self.bindings: dict[str, list[str]] = {}
+        self.connections: list[FakeConnection] = []
+        # Arguments of every basic_qos and basic_ack call
+        self.prefetch_counts: list[int] = []
+        self.acks: list[tuple[int, bool]] = []
+        # Most messages delivered but not acknowledged at the same time
+        self.max_unacked = 0
+        self.lock = threading.Lock()
+        self.__names = itertools.count(1)
+
+    def connect(self) -> "FakeConnection":
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    def publish(
+        self,
+        body: bytes,
+        queue: Optional[str] = None,
+        exchange: Optional[str] = None,
+        app_id: Optional[str] = None,
+    ) -> None:
+        with self.lock:
+            if queue is not None:
+                names = [queue]
+            else:
+                assert exchange is not None
+                names = self.bindings.get(exchange, [])
+            for name in names:
+                self.queues.setdefault(name, deque()).append(Message(body, app_id))
+
+    def disconnect(self) -> None:
+        """
+        Drop every open connection, as a broker restart would
+        """
+        for connection in self.connections:
+            connection.drop()
+
+    def bound(self, exchange: str) -> list[str]:
+        with self.lock:
+            return list(self.bindings.get(exchange, []))
+
+    def server_name(self) -> str:
+        return f"amq.gen-{next(self.__names)}"
+
+
+class FakeChannel:
+    def __init__(self, connection: "FakeConnection") -> None:
+        self.connection = connection
+        self.broker = connection.broker
+        self.prefetch = 0
+        self.unacked: dict[int, tuple[str, Message]] = {}
+        self.__tags = itertools.count(1)
+
+    def basic_qos(self, prefetch_count: int = 0) -> None:
+        self.__check()
+        self.prefetch = prefetch_count
+        self.broker.prefetch_counts.append(prefetch_count)
+
+    def exchange_declare(self, exchange: str, exchange_type: str) -> None:
+        self.__check()
+        assert exchange_type == "fanout"
+        with self.broker.lock:
+            self.broker.bindings.setdefault(exchange, [])
+
+    def queue_declare(
+        self, queue: str, exclusive: bool = False, auto_delete: bool = False
+    ) -> Any:
+        self.__check()
+        if queue.startswith("amq."):
+            raise ChannelClosedByBroker(403, "ACCESS_REFUSED")
+        name = queue or self.broker.server_name()
+        with self.broker.lock:
+            self.broker.queues.setdefault(name, deque())
+        if exclusive:
+            self.connection.exclusive.append(name)
+        return SimpleNamespace(method=SimpleNamespace(queue=name))
+
+    def queue_bind(self, queue: str, exchange: str) -> None:
+        self.__check()
+        with self.broker.lock:
+            self.broker.bindings[exchange].append(queue)
+
+    def consume(
+        self, queue: str, inactivity_timeout: float
+    ) -> Generator[tuple[Any, Any, Any], None, None]:
+        while True:
+            self.__check()
+            message = None
+            with self.broker.lock:
+                messages = self.broker.queues[queue]
+                if messages and len(self.unacked) < max(self.prefetch, 1):
+                    message = messages.popleft()
+
+            if message is None:
+                time.sleep(inactivity_timeout)
+                yield None, None, None
+                continue
+
+            tag = next(self.__tags)
+            self.unacked[tag] = (queue, message)
+            self.broker.max_unacked = max(self.broker.max_unacked, len(self.unacked))
+            yield (
+                SimpleNamespace(delivery_tag=tag, redelivered=message.redelivered),
+                SimpleNamespace(app_id=message.app_id),
+                message.body,
+            )
+
+    def basic_ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        self.__check()
+        self.broker.acks.append((delivery_tag, multiple))
+        for tag in list(self.unacked):
+            if tag == delivery_tag or (multiple and tag < delivery_tag):
+                del self.unacked[tag]
+
+    def requeue(self) -> None:
+        with self.broker.lock:
+            for queue, message in reversed(list(self.unacked.values())):
+                if queue in self.broker.queues:
+                    self.broker.queues[queue].appendleft(
+                        message._replace(redelivered=True)
+                    )
+        self.unacked.clear()
+
+    def __check(self) -> None:
+        if not self.connection.is_open:
+            raise AMQPConnectionError("Connection dropped")
+
+
+class FakeConnection:
+    def __init__(self, broker: FakeBroker) -> None:
+        self.broker = broker
+        self.is_open = True
+        self.channels: list[FakeChannel] = []
+        self.exclusive: list[str] = []
+        # Thread that closed the connection
+        self.closed_by: Optional[int] = None
+
+    def channel(self) -> FakeChannel:
+        channel = FakeChannel(self)
+        self.channels.append(channel)
+        return channel
+
+    def drop(self) -> None:
+        if not self.is_open:
+            return
+        self.is_open = False
+        for channel in self.channels:
+            channel.requeue()
+        # Exclusive queues are deleted with the connection that declared them
+        with self.broker.lock:
+            for name in self.exclusive:
+                self.broker.queues.pop(name, None)
+                for queues in self.broker.bindings.values():
+                    if name in queues:
+                        queues.remove(name)
+
+    def close(self) -> None:
+        self.closed_by = threading.get_ident()
+        self.drop()
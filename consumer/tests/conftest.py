@@ -0,0 +1,4 @@
+import os
+
+# Tests that touch the mixer run without an audio device
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
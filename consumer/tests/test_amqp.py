@@ -0,0 +1,184 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, cast
+
+import pytest
+from pika.adapters.blocking_connection import BlockingConnection
+
+from app.plugins.amqp import AMQPPlugin, decode_message
+from app.plugins.base import Reading
+from app.plugins.protocol import BINARY_MAGIC, Record, encode_record
+from tests.broker import FakeBroker
+
+
+def binary(*values: float) -> bytes:
+    records = b"".join(
+        encode_record(value, i, i) for i, value in enumerate(values, start=1)
+    )
+    return BINARY_MAGIC + records
+
+
+def make_plugin(broker: FakeBroker, **kwargs: Any) -> AMQPPlugin:
+    options: dict[str, Any] = dict(
+        queue="bpm", timeout=0.001, backoff=(0.001, 0.01), ack_interval=60.0
+    )
+    options.update(kwargs)
+    connect = cast(Callable[[], BlockingConnection], broker.connect)
+    plugin = AMQPPlugin(connection_factory=connect, **options)
+    plugin.start()
+    return plugin
+
+
+def test_decode_message_text_and_binary() -> None:
+    assert decode_message(b"60\n61.5\nbad\n") == [Record(60.0), Record(61.5)]
+    assert decode_message(binary(70.0, 71.0)) == [
+        Record(70.0, 1, 1),
+        Record(71.0, 2, 2),
+    ]
+    # A trailing partial record is discarded
+    assert decode_message(binary(72.0) + b"\x00\x01") == [Record(72.0, 1, 1)]
+
+
+def test_readings_from_text_and_binary_messages() -> None:
+    broker = FakeBroker()
+    broker.publish(b"60\n61", queue="bpm", app_id="sensor")
+    broker.publish(binary(72.0), queue="bpm")
+    plugin = make_plugin(broker)
+
+    readings = plugin.readings()
+    values = [next(readings) for _ in range(3)]
+    plugin.stop()
+
+    assert [(r.value, r.source, r.sent) for r in values] == [
+        (60.0, "amqp:sensor", None),
+        (61.0, "amqp:sensor", None),
+        (72.0, "amqp:bpm", 1),
+    ]
+
+
+def test_prefetch_is_set_and_respected() -> None:
+    broker = FakeBroker()
+    for value in range(20):
+        broker.publish(str(60 + value).encode(), queue="bpm")
+    plugin = make_plugin(broker, prefetch=4, ack_batch=4)
+
+    readings = plugin.readings()
+    for _ in range(20):
+        next(readings)
+    plugin.stop()
+
+    assert broker.prefetch_counts == [4]
+    assert broker.max_unacked <= 4
+
+
+def test_acks_are_batched() -> None:
+    broker = FakeBroker()
+    for value in range(7):
+        broker.publish(str(60 + value).encode(), queue="bpm")
+    plugin = make_plugin(broker, prefetch=8, ack_batch=3)
+
+    readings = plugin.readings()
+    for _ in range(7):
+        next(readings)
+    plugin.stop()
+
+    # A message is acknowledged once its readings have been handed on
+    assert broker.acks == [(3, True), (6, True)]
+
+
+def test_acks_are_sent_after_the_interval() -> None:
+    broker = FakeBroker()
+    broker.publish(b"60", queue="bpm")
+    plugin = make_plugin(broker, ack_batch=16, ack_interval=0.05)
+
+    readings = plugin.readings()
+    next(readings)
+    time.sleep(0.06)
+    broker.publish(b"61", queue="bpm")
+    next(readings)
+    plugin.stop()
+
+    assert broker.acks == [(1, True)]
+
+
+def test_unacked_messages_are_redelivered_after_reconnect() -> None:
+    broker = FakeBroker()
+    broker.publish(b"60\n", queue="bpm")
+    broker.publish(b"61\n", queue="bpm")
+    plugin = make_plugin(broker, ack_batch=16)
+
+    readings = plugin.readings()
+    values = [next(readings).value for _ in range(2)]
+    broker.disconnect()
+    broker.publish(b"62\n", queue="bpm")
+    values += [next(readings).value for _ in range(3)]
+    plugin.stop()
+
+    assert values == [60.0, 61.0, 60.0, 61.0, 62.0]
+    assert len(broker.connections) == 2
+
+
+def test_reconnect_declares_a_fresh_exclusive_queue() -> None:
+    broker = FakeBroker()
+    plugin = make_plugin(broker, queue="", exchange="heartbeat")
+    received: queue.Queue[Reading] = queue.Queue()
+
+    def consume() -> None:
+        for reading in plugin.readings():
+            received.put(reading)
+
+    def publish_when_bound(value: bytes) -> None:
+        deadline = time.monotonic() + 1.0
+        while not broker.bound("heartbeat"):
+            assert time.monotonic() < deadline, "Queue was never bound"
+            time.sleep(0.001)
+        broker.publish(value, exchange="heartbeat")
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    try:
+        publish_when_bound(b"60")
+        assert received.get(timeout=1.0).value == 60.0
+
+        broker.disconnect()
+        publish_when_bound(b"61")
+        assert received.get(timeout=1.0).value == 61.0
+    finally:
+        plugin.stop()
+        thread.join(timeout=1.0)
+
+    assert plugin.queue == ""
+    assert len(broker.connections) == 2
+
+
+def test_stop_from_another_thread_leaves_the_close_to_the_reader() -> None:
+    broker = FakeBroker()
+    broker.publish(b"60", queue="bpm")
+    plugin = make_plugin(broker)
+    received: queue.Queue[Reading] = queue.Queue()
+    reader: list[int] = []
+
+    def consume() -> None:
+        reader.append(threading.get_ident())
+        for reading in plugin.readings():
+            received.put(reading)
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    assert received.get(timeout=1.0).value == 60.0
+    plugin.stop()
+    thread.join(timeout=1.0)
+
+    assert not thread.is_alive()
+    assert [c.closed_by for c in broker.connections] == reader
+
+
+def test_ack_batch_larger_than_prefetch_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        AMQPPlugin(queue="bpm", prefetch=4, ack_batch=8)
+
+
+def test_missing_queue_and_exchange_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        AMQPPlugin(queue="")
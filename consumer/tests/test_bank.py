@@ -0,0 +1,32 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from app.sound.bank import WaveformBank
+from app.sound.presets import RealisticHeartbeatSound
+
+
+def built_bank(path: Path) -> WaveformBank:
+    bank = WaveformBank(
+        path=str(path), preset=RealisticHeartbeatSound, bpm_min=60, bpm_max=61
+    )
+    bank.build()
+    return bank
+
+
+def test_built_bank_is_loaded(tmp_path: Path) -> None:
+    bank = built_bank(tmp_path / "beats.bank")
+    assert bank.load()
+
+
+@pytest.mark.parametrize("extra", [1, WaveformBank.INDEX_DTYPE.itemsize + 3])
+def test_bank_truncated_in_the_index_is_not_loaded(tmp_path: Path, extra: int) -> None:
+    path = tmp_path / "beats.bank"
+    built_bank(path)
+    os.truncate(path, WaveformBank.HEADER.size + extra)
+
+    bank = WaveformBank(
+        path=str(path), preset=RealisticHeartbeatSound, bpm_min=60, bpm_max=61
+    )
+    assert not bank.load()
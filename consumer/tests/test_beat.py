@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.sound.adapter import ChannelParam
+from app.sound.beat import LiveBeat
+from app.sound.noise import DeepBrownNoiseStream
+
+
+def test_noise_is_read_in_blocks() -> None:
+    stream = DeepBrownNoiseStream(44100, calibration=0.1, block_size=256)
+    out = np.zeros(1000, dtype=np.float32)
+
+    stream.read(out)
+
+    assert np.all(out != 0.0)
+    assert np.max(np.abs(out)) < 2.0
+
+
+def test_live_heartbeats_share_one_calibrated_noise_stream() -> None:
+    slow = LiveBeat.heartbeat(60)
+    fast = LiveBeat.heartbeat(120)
+
+    assert slow.noise is fast.noise
+    assert fast.frames < slow.frames
+
+
+def test_live_heartbeat_stays_within_the_sample_range() -> None:
+    beat = LiveBeat.heartbeat(72)
+    channel_param = ChannelParam()
+    limit = 1 << (abs(channel_param.bit_depth) - 1)
+    out = np.empty((1024, channel_param.count), dtype=np.float32)
+
+    peak = 0.0
+    for start in range(0, beat.frames - len(out), len(out)):
+        beat.render(start, out)
+        peak = max(peak, float(np.max(np.abs(out))))
+
+    assert 0.0 < peak < limit
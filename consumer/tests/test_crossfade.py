@@ -0,0 +1,17 @@
+import numpy as np
+
+from app.sound.crossfade import crossfade_curves, crossfade_length
+
+
+def test_crossfade_curves_are_equal_power() -> None:
+    fade_in, fade_out = crossfade_curves(1000)
+
+    assert fade_in.shape == fade_out.shape == (1000, 1)
+    assert fade_in[0, 0] == 0.0 and fade_out[0, 0] == 1.0
+    np.testing.assert_allclose(fade_in**2 + fade_out**2, 1.0, rtol=1e-6)
+
+
+def test_crossfade_length_is_limited_by_the_shorter_beat() -> None:
+    assert crossfade_length(44100, 44100) == 4000
+    assert crossfade_length(44100, 6000) == 600
+    assert crossfade_length(44100, 800) == 400
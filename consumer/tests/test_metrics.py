@@ -0,0 +1,32 @@
+import socket
+from pathlib import Path
+
+from app.metrics import Metrics
+from app.plugins.uds import UDSPlugin
+
+
+def stage_count(metrics: Metrics, stage: str) -> int:
+    prefix = f'artbit_stage_latency_seconds_count{{stage="{stage}"}} '
+    for line in metrics.to_prometheus().splitlines():
+        if line.startswith(prefix):
+            return int(line[len(prefix) :])
+    raise KeyError(stage)
+
+
+def test_uds_readings_record_the_receive_and_parse_stages(tmp_path: Path) -> None:
+    path = str(tmp_path / "artbit.sock")
+    metrics = Metrics()
+    plugin = UDSPlugin(path, metrics=metrics)
+    plugin.start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(b"60\n")
+            reading = next(plugin.readings())
+    finally:
+        plugin.stop()
+
+    assert reading.value == 60.0
+    assert stage_count(metrics, "receive") == 1
+    assert stage_count(metrics, "parse") == 1
+    assert stage_count(metrics, "input") == 0
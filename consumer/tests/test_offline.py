@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+CONSUMER = Path(__file__).resolve().parent.parent
+
+
+def test_raw_output_to_stdout_is_only_pcm() -> None:
+    environment = dict(os.environ)
+    environment.pop("PYGAME_HIDE_SUPPORT_PROMPT", None)
+    result = subprocess.run(
+        [sys.executable, "-m", "app.offline", "--duration", "1", "--workers", "1"],
+        input=b"0 60\n",
+        capture_output=True,
+        cwd=CONSUMER,
+        env=environment,
+        check=True,
+    )
+
+    # One second of 16-bit stereo at 44.1 kHz and nothing else
+    assert len(result.stdout) == 44100 * 2 * 2
+    assert b"pygame" not in result.stdout
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from app.sound.presets import HeartbeatSoundComponent, canonical_heartbeat_wave
+
+
+@pytest.mark.parametrize("position", [0, 5, 50, 98])
+def test_place_pulse_keeps_the_larger_value_and_wraps(position: int) -> None:
+    rng = np.random.default_rng(0)
+    wave = rng.random(100, dtype=np.float32)
+    pulse = rng.random(21, dtype=np.float32)
+    expected = wave.copy()
+    indices = np.arange(position - 10, position + 11) % len(wave)
+    np.maximum.at(expected, indices, pulse)
+
+    HeartbeatSoundComponent.place_pulse(wave, pulse, position)
+
+    np.testing.assert_array_equal(wave, expected)
+
+
+def test_place_pulse_longer_than_the_period() -> None:
+    wave = np.zeros(4, dtype=np.float32)
+    pulse = np.arange(6, dtype=np.float32)
+
+    HeartbeatSoundComponent.place_pulse(wave, pulse, 3)
+
+    # Samples that overlap themselves keep the larger pulse value
+    np.testing.assert_array_equal(wave, [4.0, 5.0, 2.0, 3.0])
+
+
+def test_canonical_wave_is_rendered_at_the_given_framerate() -> None:
+    assert len(canonical_heartbeat_wave(60, 8000)) == 8000
+    assert len(canonical_heartbeat_wave(60, 22050)) == 22050
@@ -0,0 +1,101 @@
+import socket
+from pathlib import Path
+
+from app.plugins.protocol import (
+    BINARY_MAGIC,
+    Record,
+    StreamDecoder,
+    encode_record,
+)
+from app.plugins.uds import UDSPlugin
+
+# Encoding of Record(72.5, 123456789, 7), shared with the tests of the Go sink
+GOLDEN_RECORD = bytes.fromhex("000000000020524015cd5b07000000000700000000000000")
+
+
+def receive(decoder: StreamDecoder, chunks: list[bytes]) -> list[Record]:
+    """Send the chunks through a socket pair and decode them as they arrive."""
+    sender, receiver = socket.socketpair()
+    records: list[Record] = []
+    with sender, receiver:
+        for chunk in chunks:
+            sender.sendall(chunk)
+            received = 0
+            while received < len(chunk):
+                count = receiver.recv_into(decoder.free())
+                received += count
+                records += decoder.feed(count)
+    return records
+
+
+def test_record_encoding_matches_the_producer() -> None:
+    assert encode_record(72.5, 123456789, 7) == GOLDEN_RECORD
+
+
+def test_binary_records_round_trip() -> None:
+    stream = BINARY_MAGIC + b"".join(
+        encode_record(60.0 + i, 1000 * i, i) for i in range(1, 4)
+    )
+    decoder = StreamDecoder()
+
+    assert receive(decoder, [stream]) == [
+        Record(61.0, 1000, 1),
+        Record(62.0, 2000, 2),
+        Record(63.0, 3000, 3),
+    ]
+    assert decoder.binary
+    assert decoder.lost == 0
+
+
+def test_records_split_across_reads() -> None:
+    stream = BINARY_MAGIC + GOLDEN_RECORD + encode_record(73.0, 123456999, 8)
+    # Split inside the magic, inside the first record and inside the second
+    chunks = [stream[:2], stream[2:13], stream[13:33], stream[33:]]
+    decoder = StreamDecoder()
+
+    assert receive(decoder, chunks) == [
+        Record(72.5, 123456789, 7),
+        Record(73.0, 123456999, 8),
+    ]
+
+
+def test_records_split_by_a_small_buffer() -> None:
+    stream = BINARY_MAGIC + b"".join(encode_record(60.0, i, i) for i in range(1, 9))
+    # The buffer holds less than two records, so every read ends mid-record
+    decoder = StreamDecoder(capacity=40)
+
+    records = receive(decoder, [stream])
+    assert [record.sequence for record in records] == list(range(1, 9))
+
+
+def test_missing_sequence_numbers_are_counted() -> None:
+    stream = BINARY_MAGIC + b"".join(
+        encode_record(60.0, sequence, sequence) for sequence in [1, 2, 5, 6, 9]
+    )
+    decoder = StreamDecoder()
+
+    receive(decoder, [stream[:52], stream[52:]])
+    assert decoder.lost == 4
+
+
+def test_text_lines_split_across_reads() -> None:
+    decoder = StreamDecoder()
+
+    records = receive(decoder, [b"60.5\n6", b"1\nbad\n62", b"\n"])
+    assert records == [Record(60.5), Record(61.0), Record(62.0)]
+    assert decoder.binary is False
+
+
+def test_uds_readings_carry_the_producer_time(tmp_path: Path) -> None:
+    path = str(tmp_path / "artbit.sock")
+    plugin = UDSPlugin(path)
+    plugin.start()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(BINARY_MAGIC + GOLDEN_RECORD)
+            reading = next(plugin.readings())
+    finally:
+        plugin.stop()
+
+    assert (reading.value, reading.source, reading.sent) == (72.5, "uds", 123456789)
@@ -0,0 +1,59 @@
+import wave
+from pathlib import Path
+
+import pytest
+
+from app.sound.player import WavRecorder
+
+
+class SmallWavRecorder(WavRecorder):
+    # Stands in for the 4 GiB limit of the WAV sizes
+    MAX_DATA_SIZE = 1000
+
+
+def make_recorder(path: Path, recorder: type[WavRecorder] = WavRecorder) -> WavRecorder:
+    return recorder(
+        channel_bit_depth=-16,
+        channel_frame_rate=44100,
+        channel_count=2,
+        filename=str(path),
+    )
+
+
+def test_recording_rotates_below_the_wav_size_limit(tmp_path: Path) -> None:
+    recorder = make_recorder(tmp_path / "take.wav", SmallWavRecorder)
+    for _ in range(5):
+        recorder.record(bytes(400))
+    recorder.close()
+
+    paths = [tmp_path / "take.wav", tmp_path / "take.1.wav", tmp_path / "take.2.wav"]
+    assert sorted(tmp_path.iterdir()) == sorted(paths)
+    frames: list[int] = []
+    for path in paths:
+        with wave.open(str(path), "rb") as f:
+            frames.append(f.getnframes())
+    assert frames == [200, 200, 100]
+
+
+def test_files_of_an_earlier_recording_are_removed(tmp_path: Path) -> None:
+    for name in ["take.wav", "take.1.wav", "take.7.wav"]:
+        (tmp_path / name).write_bytes(b"stale")
+    (tmp_path / "other.1.wav").write_bytes(b"kept")
+
+    recorder = make_recorder(tmp_path / "take.wav")
+    recorder.record(bytes(400))
+    recorder.close()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "other.1.wav",
+        "take.wav",
+    ]
+
+
+def test_writer_errors_are_raised_on_close(tmp_path: Path) -> None:
+    recorder = make_recorder(tmp_path / "missing" / "take.wav")
+    recorder.record(bytes(400))
+
+    with pytest.raises(RuntimeError) as error:
+        recorder.close()
+    assert isinstance(error.value.__cause__, OSError)
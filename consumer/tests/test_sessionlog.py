@@ -0,0 +1,76 @@
+import logging
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from app.plugins.base import Reading
+from app.sessionlog import MAX_SOURCES, OTHER_SOURCE, SessionLog, read_log
+
+
+def test_readings_are_exported_with_their_sources(tmp_path: Path) -> None:
+    path = str(tmp_path / "session.log")
+    log = SessionLog(path)
+    log.start()
+    log.log(Reading(60.0, "uds:1", time.monotonic()))
+    log.log(Reading(61.0, "amqp:sensor", time.monotonic()))
+    log.stop()
+
+    assert [(value, source) for _, value, source in read_log(path)] == [
+        (60.0, "uds:1"),
+        (61.0, "amqp:sensor"),
+    ]
+
+
+def test_sources_beyond_the_table_share_one_slot(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    path = str(tmp_path / "session.log")
+    log = SessionLog(path)
+    log.start()
+    with caplog.at_level(logging.WARNING):
+        for i in range(MAX_SOURCES + 8):
+            log.log(Reading(60.0, f"uds:{i}", time.monotonic()))
+        log.log(Reading(61.0, f"uds:{MAX_SOURCES + 4}", time.monotonic()))
+    log.stop()
+
+    sources = [source for _, _, source in read_log(path)]
+    assert sources[: MAX_SOURCES - 1] == [f"uds:{i}" for i in range(MAX_SOURCES - 1)]
+    assert set(sources[MAX_SOURCES - 1 :]) == {OTHER_SOURCE}
+    assert len(caplog.records) == 1
+
+
+def test_full_buffer_is_written_by_the_thread(tmp_path: Path) -> None:
+    path = str(tmp_path / "session.log")
+    log = SessionLog(path, flush_interval=60.0, buffer_size=8)
+    log.start()
+    size = os.path.getsize(path)
+    for i in range(4):
+        log.log(Reading(60.0 + i, "uds:1", time.monotonic()))
+
+    deadline = time.monotonic() + 1.0
+    while os.path.getsize(path) == size and time.monotonic() < deadline:
+        time.sleep(0.01)
+    written = os.path.getsize(path) > size
+    log.stop()
+
+    assert written
+    assert len(list(read_log(path))) == 4
+
+
+def test_records_beyond_a_full_buffer_are_dropped(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    log = SessionLog(str(tmp_path / "session.log"), buffer_size=4)
+    # Without the thread running nothing drains the buffer
+    for i in range(10):
+        log.log(Reading(60.0 + i, "uds", time.monotonic()))
+    with caplog.at_level(logging.WARNING):
+        log.flush()
+        log.flush()
+
+    assert log.dropped == 6
+    assert [r.message for r in caplog.records] == [
+        f"Dropped 6 records, the session log {log.path} fell behind"
+    ]
@@ -48,6 +48,8 @@ func init() {
 		StringVar(&outputUDSConfig.SocketPath, "output-uds-socket", "/tmp/artbit.sock", "Socket path for UDS output")
 	rootCmd.PersistentFlags().
 		DurationVar(&outputUDSConfig.Timeout, "output-uds-timeout", 100*time.Millisecond, "Timeout for UDS output")
+	rootCmd.PersistentFlags().
+		StringVar(&outputUDSConfig.Encoding, "output-uds-encoding", "text", "Encoding for UDS output (text or binary)")
 	rootCmd.PersistentFlags().
 		BoolVar(&developmentMode, "dev", false, "Enable development mode")
 	rootCmd.AddCommand(runCmd)
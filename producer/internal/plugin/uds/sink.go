@@ -1,35 +1,63 @@
 package uds
 
 import (
+	"encoding/binary"
 	"fmt"
 	"log"
+	"math"
 	"net"
+	"sync/atomic"
 	"time"
 )
 
+// Encoding of the values written to the socket
+type Encoding string
+
+const (
+	// EncodingText writes each value as a newline-terminated decimal number
+	EncodingText Encoding = "text"
+	// EncodingBinary writes the binary magic followed by fixed-size records
+	EncodingBinary Encoding = "binary"
+)
+
+// BinaryMagic starts a stream in the binary encoding
+var BinaryMagic = []byte{'A', 'B', 'T', 0x01}
+
+// RecordSize is the size of a binary record: little-endian float64 value,
+// int64 monotonic timestamp in nanoseconds and uint64 sequence number
+const RecordSize = 24
+
 // Unix Domain Socket (UDS) sink
 type Sink struct {
 	// UDS socket path
 	SocketPath string
 	// Timeout for sending data
 	Timeout time.Duration
+	// Encoding of the written values
+	Encoding Encoding
 	// Connection
 	conn net.Conn
 	// Channel for sending data
 	dataCh chan []byte
 	// Channel for stopping the sink
 	stopCh chan struct{}
+	// Reference point of the monotonic record timestamps
+	epoch time.Time
+	// Sequence number of the last binary record
+	sequence atomic.Uint64
 }
 
 var logger = log.New(log.Writer(), "uds-sink: ", log.LstdFlags)
 
 // NewSink creates a new UDS sink
-func NewSink(socketPath string, timeout time.Duration) *Sink {
+func NewSink(socketPath string, timeout time.Duration, encoding Encoding) *Sink {
 	return &Sink{
 		SocketPath: socketPath,
 		Timeout:    timeout,
+		Encoding:   encoding,
 		dataCh:     make(chan []byte),
 		stopCh:     make(chan struct{}),
+		epoch:      time.Now(),
 	}
 }
 
@@ -58,6 +86,12 @@ func (s *Sink) Start() error {
 		s.conn = conn
 	}
 
+	if s.Encoding == EncodingBinary {
+		if err := s.send(BinaryMagic); err != nil {
+			return fmt.Errorf("failed to negotiate binary encoding: %w", err)
+		}
+	}
+
 	go s.sendData()
 
 	return nil
@@ -78,7 +112,12 @@ func (s *Sink) Stop() error {
 // Write writes data to the UDS sink
 func (s *Sink) Write(value float64) error {
 	// Convert value to byte slice
-	data := []byte(fmt.Sprintf("%f\n", value))
+	var data []byte
+	if s.Encoding == EncodingBinary {
+		data = s.encodeRecord(value)
+	} else {
+		data = []byte(fmt.Sprintf("%f\n", value))
+	}
 
 	// Send data to the channel
 	s.dataCh <- data
@@ -86,6 +125,22 @@ func (s *Sink) Write(value float64) error {
 	return nil
 }
 
+// encodeRecord encodes a value as the next binary record of the sink
+func (s *Sink) encodeRecord(value float64) []byte {
+	// time.Since uses the monotonic clock reading of the epoch
+	return EncodeRecord(value, time.Since(s.epoch).Nanoseconds(), s.sequence.Add(1))
+}
+
+// EncodeRecord encodes a value with its timestamp in nanoseconds and its
+// sequence number as a binary record
+func EncodeRecord(value float64, timestamp int64, sequence uint64) []byte {
+	data := make([]byte, RecordSize)
+	binary.LittleEndian.PutUint64(data[0:], math.Float64bits(value))
+	binary.LittleEndian.PutUint64(data[8:], uint64(timestamp))
+	binary.LittleEndian.PutUint64(data[16:], sequence)
+	return data
+}
+
 // sendData sends data to the UDS socket
 func (s *Sink) sendData() {
 	for {
@@ -0,0 +1,92 @@
+package uds
+
+import (
+	"bytes"
+	"encoding/binary"
+	"encoding/hex"
+	"io"
+	"math"
+	"net"
+	"path/filepath"
+	"testing"
+	"time"
+)
+
+// Encoding of the value 72.5 at 123456789 ns with sequence number 7, shared
+// with the tests of the consumer decoder
+const goldenRecord = "000000000020524015cd5b07000000000700000000000000"
+
+func TestEncodeRecord(t *testing.T) {
+	got := hex.EncodeToString(EncodeRecord(72.5, 123456789, 7))
+	if got != goldenRecord {
+		t.Errorf("EncodeRecord(72.5, 123456789, 7) = %s; want %s", got, goldenRecord)
+	}
+}
+
+func TestSinkBinaryRoundTrip(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "artbit.sock")
+	listener, err := net.Listen("unix", path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer listener.Close()
+
+	accepted := make(chan net.Conn, 1)
+	go func() {
+		conn, err := listener.Accept()
+		if err != nil {
+			accepted <- nil
+			return
+		}
+		accepted <- conn
+	}()
+
+	sink := NewSink(path, time.Second, EncodingBinary)
+	if err := sink.Start(); err != nil {
+		t.Fatal(err)
+	}
+	defer sink.Stop()
+
+	conn := <-accepted
+	if conn == nil {
+		t.Fatal("failed to accept the sink connection")
+	}
+	defer conn.Close()
+
+	values := []float64{60, 61.5, 72.25}
+	for _, value := range values {
+		if err := sink.Write(value); err != nil {
+			t.Fatal(err)
+		}
+	}
+
+	if err := conn.SetReadDeadline(time.Now().Add(time.Second)); err != nil {
+		t.Fatal(err)
+	}
+	data := make([]byte, len(BinaryMagic)+len(values)*RecordSize)
+	if _, err := io.ReadFull(conn, data); err != nil {
+		t.Fatal(err)
+	}
+
+	if !bytes.Equal(data[:len(BinaryMagic)], BinaryMagic) {
+		t.Fatalf("stream starts with %x; want %x", data[:len(BinaryMagic)], BinaryMagic)
+	}
+	var last int64
+	for i, want := range values {
+		record := data[len(BinaryMagic)+i*RecordSize:]
+		value := math.Float64frombits(binary.LittleEndian.Uint64(record[0:]))
+		timestamp := int64(binary.LittleEndian.Uint64(record[8:]))
+		sequence := binary.LittleEndian.Uint64(record[16:])
+
+		if value != want {
+			t.Errorf("record %d value = %v; want %v", i, value, want)
+		}
+		if sequence != uint64(i+1) {
+			t.Errorf("record %d sequence = %d; want %d", i, sequence, i+1)
+		}
+		if timestamp < last {
+			t.Errorf("record %d timestamp %d is before %d", i, timestamp, last)
+		}
+		last = timestamp
+	}
+}
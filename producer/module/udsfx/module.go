@@ -25,13 +25,22 @@ type Result struct {
 type Config struct {
 	SocketPath string        `json:"socket_path"`
 	Timeout    time.Duration `json:"timeout"`
+	Encoding   string        `json:"encoding"`
 }
 
 func New(p Param) (Result, error) {
 	if p.Config == nil {
 		return Result{}, fmt.Errorf("config is nil")
 	}
-	sink := uds.NewSink(p.Config.SocketPath, p.Config.Timeout)
+	encoding := uds.Encoding(p.Config.Encoding)
+	switch encoding {
+	case "":
+		encoding = uds.EncodingText
+	case uds.EncodingText, uds.EncodingBinary:
+	default:
+		return Result{}, fmt.Errorf("invalid UDS encoding: %s", p.Config.Encoding)
+	}
+	sink := uds.NewSink(p.Config.SocketPath, p.Config.Timeout, encoding)
 	return Result{Output: sink}, nil
 }
 